@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import sys
+import timeit
+from datetime import datetime, timezone
+from typing import List
+from uuid import uuid4
+
+import orjson
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from server import Medication, Message, model_projection
+
+
+def make_medications(count):
+    now = datetime.now(timezone.utc).isoformat()
+    return [{
+        "id": str(uuid4()),
+        "user_email": "bench@example.com",
+        "name": f"Medication {i}",
+        "dosage": "500mg",
+        "frequency": "Twice daily",
+        "times": ["08:00", "20:00"],
+        "instructions": "Take with food",
+        "created_at": now
+    } for i in range(count)]
+
+
+def make_messages(count):
+    now = datetime.now(timezone.utc).isoformat()
+    return [{
+        "id": str(uuid4()),
+        "user_email": "bench@example.com",
+        "doctor_name": "Dr. Smith",
+        "message": "I have a question about my medication schedule. " * 4,
+        "reply": "Please keep taking it with food." if i % 2 else None,
+        "created_at": now
+    } for i in range(count)]
+
+
+def validated_path(loop, model, field, docs):
+    # What a response_model route does: build the models, then FastAPI validates and encodes them again.
+    content = loop.run_until_complete(serialize_response(field=field, response_content=[model(**doc) for doc in docs]))
+    return JSONResponse(content).body
+
+
+def fast_path(model, docs):
+    fields = model_projection(model)
+    return ORJSONResponse([{key: doc.get(key) for key in fields} for doc in docs]).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare response_model serialization with the FAST_RESPONSES path")
+    parser.add_argument("--docs", type=int, default=1000, help="Documents per list response")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per path")
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    print(f"📏 {args.docs} documents per response, best of {args.repeat} runs")
+    for model, docs in ((Medication, make_medications(args.docs)), (Message, make_messages(args.docs))):
+        field = create_response_field(name="Response", type_=List[model])
+        if orjson.loads(validated_path(loop, model, field, docs)) != orjson.loads(fast_path(model, docs)):
+            print(f"❌ {model.__name__}: fast path output differs from the validated path")
+            return 1
+        slow = min(timeit.repeat(lambda: validated_path(loop, model, field, docs), number=1, repeat=args.repeat))
+        fast = min(timeit.repeat(lambda: fast_path(model, docs), number=1, repeat=args.repeat))
+        print(f"{model.__name__:<12} validated: {slow * 1000:8.2f}ms   fast: {fast * 1000:8.2f}ms   speedup: {slow / fast:5.1f}x")
+    loop.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import sys
+
+from server import (
+    DB_NAME, SYNC_TOMBSTONE_RETENTION_DAYS, compact_change_log, create_mongo_client, ensure_indexes, find_collection_scans,
+    migrate_tracker_to_buckets, rebuild_adherence_rollups, run_missed_dose_sweep,
+)
+
+client = create_mongo_client()
+db = client[DB_NAME]
+
+
+async def cmd_ensure_indexes(args):
+    await ensure_indexes(db)
+    print("Indexes ensured")
+    return 0
+
+
+async def cmd_check_query_plans(args):
+    if args.ensure:
+        await ensure_indexes(db)
+    scans = await find_collection_scans(db)
+    for scan in scans:
+        print(f"❌ {scan['route']}: {scan['collection']} {scan['query']} uses {scan['stage']}")
+    if scans:
+        return 1
+    print("✅ All route queries and sorts are index-backed")
+    return 0
+
+
+async def cmd_backfill_rollups(args):
+    users = await rebuild_adherence_rollups(db, args.user)
+    print(f"Rebuilt adherence rollups for {users} user(s)")
+    return 0
+
+
+async def cmd_migrate_tracker_buckets(args):
+    stats = await migrate_tracker_to_buckets(db, args.user, args.drop_source)
+    print(f"Copied {stats['events']} tracker events for {stats['users']} user(s), {stats['skipped']} already bucketed")
+    if args.drop_source:
+        print(f"Deleted {stats['dropped']} migrated daily_tracker document(s)")
+    else:
+        print("daily_tracker was left in place; once TRACKER_STORAGE=buckets is live, re-run with --drop-source "
+              "to copy anything written in between and delete the migrated documents")
+    return 0
+
+
+async def cmd_compact_sync_log(args):
+    removed = await compact_change_log(db, args.days)
+    print(f"Removed {removed} sync tombstone(s) older than {args.days} day(s)")
+    return 0
+
+
+async def cmd_sweep_missed_doses(args):
+    stats = await run_missed_dose_sweep(db)
+    if stats is None:
+        print("❌ Another missed-dose sweep holds the lease")
+        return 1
+    print(f"Swept {stats['users']} user(s) for {stats['day']}, marked {stats['missed']} dose(s) missed")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MedBuddy backend maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("ensure-indexes", help="Create any missing indexes")
+
+    check = subparsers.add_parser("check-query-plans", help="Fail if any route query would do a collection scan")
+    check.add_argument("--ensure", action="store_true", help="Ensure indexes before checking")
+
+    backfill = subparsers.add_parser("backfill-rollups", help="Rebuild adherence rollups from daily_tracker")
+    backfill.add_argument("--user", help="Only rebuild rollups for this email")
+
+    migrate = subparsers.add_parser("migrate-tracker-buckets", help="Copy daily_tracker events into monthly bucket documents")
+    migrate.add_argument("--user", help="Only migrate this email")
+    migrate.add_argument("--drop-source", action="store_true", help="Delete daily_tracker documents once they are in a bucket")
+
+    compact = subparsers.add_parser("compact-sync-log", help="Drop old delete tombstones from the sync change log")
+    compact.add_argument("--days", type=int, default=SYNC_TOMBSTONE_RETENTION_DAYS, help="Keep tombstones newer than this")
+
+    subparsers.add_parser("sweep-missed-doses", help="Run one missed-dose sweep pass, resuming from its checkpoint")
+
+    args = parser.parse_args()
+    commands = {
+        "ensure-indexes": cmd_ensure_indexes,
+        "check-query-plans": cmd_check_query_plans,
+        "backfill-rollups": cmd_backfill_rollups,
+        "migrate-tracker-buckets": cmd_migrate_tracker_buckets,
+        "compact-sync-log": cmd_compact_sync_log,
+        "sweep-missed-doses": cmd_sweep_missed_doses,
+    }
+    try:
+        return asyncio.run(commands[args.command](args))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,394 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure, BulkWriteError, DuplicateKeyError
+from pymongo import monitoring
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
+import json
+import re
+import zlib
+import hashlib
+import csv
+import io
+import orjson
+import numpy as np
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
+from uuid import uuid4
+from collections import OrderedDict
+from bisect import bisect_left, insort
 from passlib.context import CryptContext
 import jwt
+import time
+import math
+import asyncio
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0'))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            label_str = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            prefix = label_str + "," if label_str else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f"{{{label_str}}}" if label_str else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+request_latency = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+mongo_command_latency = Histogram("mongodb_command_duration_seconds", "MongoDB command latency by collection and command (sampled).", ("collection", "command", "outcome"))
+mongo_checkout_wait = Histogram("mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection (sampled).", ())
+metrics_state = {"in_flight": 0}
+
+class CommandTimer(monitoring.CommandListener):
+    def __init__(self):
+        self._started = {}
+
+    def started(self, event):
+        if random.random() < METRICS_SAMPLE_RATE:
+            collection = event.command.get(event.command_name)
+            collection = collection if isinstance(collection, str) else ""
+            self._started[(event.request_id, event.connection_id)] = (time.perf_counter(), collection)
+
+    def _finish(self, event, outcome: str):
+        started = self._started.pop((event.request_id, event.connection_id), None)
+        if started is not None:
+            mongo_command_latency.observe((started[1], event.command_name, outcome), time.perf_counter() - started[0])
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "failed")
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    # Tracks pool occupancy for readiness and, when metrics are on, checkout wait time.
+    # Motor runs pool checkouts on its worker threads, so the start time is tracked per thread.
+    def __init__(self):
+        self.open_connections = 0
+        self.checked_out = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _adjust(self, attr: str, delta: int):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + delta)
+
+    def connection_check_out_started(self, event):
+        sampled = METRICS_ENABLED and random.random() < METRICS_SAMPLE_RATE
+        self._local.started = time.perf_counter() if sampled else None
+
+    def _finish_checkout(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            self._local.started = None
+            mongo_checkout_wait.observe((), time.perf_counter() - started)
+
+    def connection_checked_out(self, event):
+        self._adjust("checked_out", 1)
+        self._finish_checkout()
+
+    def connection_check_out_failed(self, event):
+        self._finish_checkout()
+
+    def connection_checked_in(self, event):
+        self._adjust("checked_out", -1)
+
+    def connection_created(self, event):
+        self._adjust("open_connections", 1)
+
+    def connection_closed(self, event):
+        self._adjust("open_connections", -1)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+pool_monitor = PoolMonitor()
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+DB_NAME = os.environ['DB_NAME']
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', '')
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'primary')
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "event_listeners": [pool_monitor] + ([CommandTimer()] if METRICS_ENABLED else []),
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return AsyncIOMotorClient(mongo_url, **options)
+
+# Created by the app lifespan (or by scripts through create_mongo_client).
+client = None
+db = None
+
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("caregivers", ASCENDING), ("email", ASCENDING)], name="caregivers_email"),
+    ],
+    "medications": [
+        IndexModel([("user_email", ASCENDING), ("id", ASCENDING)], name="user_email_id_unique", unique=True),
+        IndexModel([("user_email", ASCENDING), ("_id", ASCENDING)], name="user_email_keyset"),
+    ],
+    "daily_tracker": [
+        IndexModel([("user_email", ASCENDING), ("date", ASCENDING)], name="user_email_date"),
+        IndexModel([("user_email", ASCENDING), ("_id", ASCENDING)], name="user_email_keyset"),
+    ],
+    "daily_tracker_buckets": [
+        IndexModel([("user_email", ASCENDING), ("month", ASCENDING)], name="user_email_month"),
+        IndexModel([("user_email", ASCENDING), ("month", ASCENDING), ("_id", ASCENDING)], name="user_email_month_keyset"),
+    ],
+    "water_intake": [
+        IndexModel([("user_email", ASCENDING), ("date", ASCENDING)], name="user_email_date_unique", unique=True),
+        IndexModel([("user_email", ASCENDING), ("_id", ASCENDING)], name="user_email_keyset"),
+    ],
+    "lunch_tracker": [
+        IndexModel([("user_email", ASCENDING), ("date", ASCENDING)], name="user_email_date_unique", unique=True),
+        IndexModel([("user_email", ASCENDING), ("_id", ASCENDING)], name="user_email_keyset"),
+    ],
+    "appointments": [
+        IndexModel([("user_email", ASCENDING), ("_id", ASCENDING)], name="user_email_keyset"),
+        IndexModel([("user_email", ASCENDING), ("status", ASCENDING), ("_id", ASCENDING)], name="user_email_status_keyset"),
+        IndexModel([("doctor_name", ASCENDING), ("date", ASCENDING)], name="doctor_name_date"),
+    ],
+    "messages": [
+        IndexModel([("user_email", ASCENDING), ("_id", ASCENDING)], name="user_email_keyset"),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))),
+    ],
+    "change_log": [
+        IndexModel([("user_email", ASCENDING), ("collection", ASCENDING), ("doc_id", ASCENDING)], name="user_email_collection_doc_unique", unique=True),
+        IndexModel([("user_email", ASCENDING), ("seq", ASCENDING)], name="user_email_seq"),
+    ],
+    "adherence_rollups": [
+        IndexModel(
+            [("user_email", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING), ("medication_id", ASCENDING)],
+            name="user_email_granularity_bucket_medication_unique",
+            unique=True
+        ),
+    ],
+}
+
+# Representative filter for every query a route issues; each must be served by an index.
+ROUTE_QUERIES = [
+    ("get_current_user", "users", {"email": "user@example.com"}),
+    ("register", "users", {"email": "user@example.com"}),
+    ("get_medications", "medications", {"user_email": "user@example.com"}),
+    ("update_medication", "medications", {"id": "med-id", "user_email": "user@example.com"}),
+    ("track_medication", "medications", {"id": "med-id", "user_email": "user@example.com"}),
+    ("get_today_tracker", "daily_tracker", {"user_email": "user@example.com", "date": "2026-01-01"}),
+    ("get_today_tracker", "daily_tracker_buckets", {"user_email": "user@example.com", "month": "2026-01"}),
+    ("get_today_tracker", "water_intake", {"user_email": "user@example.com", "date": "2026-01-01"}),
+    ("get_today_tracker", "lunch_tracker", {"user_email": "user@example.com", "date": "2026-01-01"}),
+    ("get_appointments", "appointments", {"user_email": "user@example.com"}),
+    ("get_reminders", "appointments", {"user_email": "user@example.com", "status": "pending"}),
+    ("create_appointment", "appointments", {"doctor_name": "Dr. Smith", "date": "2026-01-01"}),
+    ("get_messages", "messages", {"user_email": "user@example.com"}),
+    ("get_patients_dashboard", "users", {"caregivers": "caregiver@example.com"}),
+    ("sync", "change_log", {"user_email": "user@example.com", "seq": {"$gt": 0}}, [("seq", ASCENDING)]),
+    ("export_history", "medications", {"user_email": "user@example.com"}, [("_id", ASCENDING)]),
+    ("export_history", "appointments", {"user_email": "user@example.com"}, [("_id", ASCENDING)]),
+    ("export_history", "water_intake", {"user_email": "user@example.com"}, [("_id", ASCENDING)]),
+    ("export_history", "lunch_tracker", {"user_email": "user@example.com"}, [("_id", ASCENDING)]),
+    ("export_history", "daily_tracker", {"user_email": "user@example.com"}, [("_id", ASCENDING)]),
+    ("export_history", "daily_tracker_buckets", {"user_email": "user@example.com"}, [("month", ASCENDING), ("_id", ASCENDING)]),
+]
+
+async def ensure_indexes(database):
+    for collection, indexes in INDEXES.items():
+        try:
+            await database[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            logger.error("Could not create indexes on %s: %s", collection, e)
+
+def _plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def find_collection_scans(database):
+    # Entries may carry a sort; a SORT stage means mongod sorts the whole result in memory.
+    scans = []
+    for route, collection, query, *sort in ROUTE_QUERIES:
+        cursor = database[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort[0])
+        explain = await cursor.explain()
+        stages = set(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        for stage in ("COLLSCAN", "SORT"):
+            if stage in stages:
+                scans.append({"route": route, "collection": collection, "query": query, "stage": stage})
+    return scans
+
+MAX_TRACKER_BATCH_SIZE = int(os.environ.get('MAX_TRACKER_BATCH_SIZE', '500'))
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '1000'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '1000'))
+FAST_RESPONSES = os.environ.get('FAST_RESPONSES', 'false').lower() == 'true'
+
+def _keyset_query(query: dict, after: Optional[str]) -> dict:
+    if not after:
+        return query
+    try:
+        return {**query, "_id": {"$gt": ObjectId(after)}}
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_page(collection, query: dict, limit: int, after: Optional[str] = None, projection: Optional[dict] = None):
+    docs = await collection.find(_keyset_query(query, after), projection).sort("_id", ASCENDING).to_list(limit + 1)
+    next_cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    docs = docs[:limit]
+    for doc in docs:
+        doc.pop("_id", None)
+    return docs, next_cursor
+
+async def stream_ndjson(collection, query: dict, limit: Optional[int] = None, after: Optional[str] = None, kind: Optional[str] = None):
+    cursor = collection.find(_keyset_query(query, after), {"_id": 0}).sort("_id", ASCENDING)
+    if limit:
+        cursor = cursor.limit(limit)
+    async for doc in cursor:
+        if kind:
+            doc["kind"] = kind
+        yield orjson.dumps(doc) + b"\n"
+
+async def list_documents(collection, query: dict, model, response: Response, limit: Optional[int], after: Optional[str], stream: bool):
+    if stream:
+        return StreamingResponse(stream_ndjson(collection, query, limit, after), media_type="application/x-ndjson")
+    projection = model_projection(model) if FAST_RESPONSES else None
+    docs, next_cursor = await fetch_page(collection, query, limit or DEFAULT_PAGE_SIZE, after, projection)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if FAST_RESPONSES:
+        return fast_json(response, docs)
+    return [model(**doc) for doc in docs]
+
+def model_projection(model) -> dict:
+    return {field: 1 for field in model.model_fields}
+
+def fast_json(response: Response, content) -> ORJSONResponse:
+    # Documents read or written by this service already match their models; encode them
+    # directly instead of letting FastAPI validate and serialize them a second time.
+    return ORJSONResponse(content, headers=dict(response.headers))
+
+def model_response(model, doc: dict, response: Response):
+    if FAST_RESPONSES:
+        return fast_json(response, {field: doc.get(field) for field in model.model_fields})
+    return model(**doc)
+
+async def warm_up(app: FastAPI):
+    # Retries until Mongo answers, so a deploy that starts before the database is reachable still becomes ready.
+    backoff = 1
+    while True:
+        try:
+            await asyncio.gather(*(db.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
+            if os.environ.get('ENSURE_INDEXES', 'true').lower() == 'true':
+                await ensure_indexes(db)
+            app.state.ready = True
+            logger.info("Warm-up complete with %d pooled connections", pool_monitor.open_connections)
+            return
+        except Exception as e:
+            logger.error("Warm-up failed, retrying in %ds: %s", backoff, e)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    client = create_mongo_client()
+    db = client[DB_NAME]
+    app.state.ready = False
+    if PASSWORD_HASH_TARGET_MS > 0:
+        rounds = await password_hasher.calibrate(PASSWORD_HASH_TARGET_MS)
+        logger.info("Calibrated bcrypt cost to %d rounds for a %.0fms target", rounds, PASSWORD_HASH_TARGET_MS)
+    background = [asyncio.create_task(warm_up(app))]
+    if os.environ.get('EVENT_STREAM_WATCH', 'true').lower() == 'true':
+        background.append(asyncio.create_task(watch_event_sources()))
+        background.append(asyncio.create_task(record_event_sources()))
+    buffer_task = asyncio.create_task(tracker_buffer.run()) if TRACKER_WRITE_BEHIND else None
+    if MISSED_DOSE_SWEEP:
+        background.append(asyncio.create_task(missed_dose_sweeper()))
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        if buffer_task is not None:
+            tracker_buffer.stop()
+            await asyncio.gather(buffer_task, return_exceptions=True)
+            await tracker_buffer.drain()
+            logger.info("Write-behind drained: %d updates received, %d writes issued", tracker_buffer.received, tracker_buffer.written)
+        logger.info("User cache stats: %s", user_cache.stats())
+        password_hasher.shutdown()
+        client.close()
+
+app = FastAPI(lifespan=lifespan)
 api_router = APIRouter(prefix="/api")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -29,28 +398,262 @@ SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-product
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '10000'))
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+
+class TTLCache:
+    # Bounded LRU of dict values with a per-entry TTL, e.g. user documents keyed by token subject.
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def set(self, key: str, value: dict):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+user_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
+class LoadingCache:
+    # Bounded LRU of values built by an async loader. An entry older than ttl is rebuilt on its next get,
+    # or handed to refresh to be brought up to date in place when one is given.
+    def __init__(self, max_size: int, ttl: float, loader, refresh=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.loader = loader
+        self.refresh = refresh
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl:
+            started = time.monotonic()
+            if entry is not None and self.refresh is not None:
+                value = await self.refresh(key, entry[0])
+            else:
+                value = await self.loader(key)
+            entry = self._entries[key] = (value, started)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry[0]
+
+    def peek(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
+IDEMPOTENCY_CACHE_TTL_SECONDS = float(os.environ.get('IDEMPOTENCY_CACHE_TTL_SECONDS', '300'))
+# How long a claimed key stays in_progress before a retry may take it over from a worker that died mid-request.
+IDEMPOTENCY_LEASE_SECONDS = float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '60'))
+
+idempotency_cache = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_CACHE_TTL_SECONDS)
+
+class IdempotentRequest:
+    # Claims an Idempotency-Key before the handler runs and stores its response afterwards.
+    # A retry with the same key is answered from the stored response without redoing the write.
+    def __init__(self, request: Request, user: dict, scope: str, payload):
+        self.key = request.headers.get("idempotency-key")
+        self.record_id = f"{user['email']}:{scope}:{self.key}"
+        self.fingerprint = hashlib.sha256(orjson.dumps(jsonable_encoder(payload))).hexdigest()
+        self.claim = None
+        self.replay = None
+        self.result = None
+
+    def _replay(self, record: dict) -> Response:
+        if record["fingerprint"] != self.fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        return ORJSONResponse(record["response"], status_code=record["status_code"], headers={"Idempotent-Replayed": "true"})
+
+    async def __aenter__(self):
+        if not self.key:
+            return self
+        if len(self.key) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+        cached = idempotency_cache.get(self.record_id)
+        if cached is not None:
+            self.replay = self._replay(cached)
+            return self
+        now = datetime.now(timezone.utc)
+        self.claim = str(uuid4())
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": self.record_id,
+                "fingerprint": self.fingerprint,
+                "state": "in_progress",
+                "claim": self.claim,
+                "claimed_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                "created_at": now
+            })
+        except DuplicateKeyError:
+            record = await db.idempotency_keys.find_one({"_id": self.record_id})
+            if record is not None and record["state"] == "completed":
+                idempotency_cache.set(self.record_id, record)
+                self.replay = self._replay(record)
+                return self
+            if record is not None and record["fingerprint"] != self.fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            # The claim outlived its lease, so whoever held it is gone; take it over and run the request again.
+            taken = record is not None and (await db.idempotency_keys.update_one(
+                {"_id": self.record_id, "state": "in_progress", "claimed_until": {"$not": {"$gte": now}}},
+                {"$set": {"claim": self.claim, "claimed_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}}
+            )).modified_count == 1
+            if not taken:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if not self.key or self.replay is not None:
+            return False
+        if exc_type is not None or self.result is None:
+            # Release the key so the client can retry a request that failed.
+            await db.idempotency_keys.delete_one({"_id": self.record_id, "state": "in_progress", "claim": self.claim})
+            return False
+        record = {"fingerprint": self.fingerprint, "state": "completed", "status_code": 200, "response": jsonable_encoder(self.result)}
+        await db.idempotency_keys.update_one({"_id": self.record_id, "claim": self.claim}, {"$set": record, "$unset": {"claimed_until": ""}})
+        idempotency_cache.set(self.record_id, record)
+        return False
+
+PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', '250'))
+# Calibration only ever raises the cost above pwd_context's baseline, never below it.
+BCRYPT_MIN_ROUNDS = int(os.environ.get('BCRYPT_MIN_ROUNDS', str(pwd_context.handler("bcrypt").default_rounds)))
+BCRYPT_MAX_ROUNDS = max(BCRYPT_MIN_ROUNDS, int(os.environ.get('BCRYPT_MAX_ROUNDS', '14')))
+BCRYPT_CALIBRATION_SAMPLES = int(os.environ.get('BCRYPT_CALIBRATION_SAMPLES', '3'))
+
+def _hash_password(password: str, rounds: int) -> str:
+    return pwd_context.handler("bcrypt").using(rounds=rounds).hash(password)
+
+def _verify_password(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password, hashed)
+
+def _time_bcrypt(rounds: int) -> float:
+    start = time.perf_counter()
+    _hash_password("calibration-password", rounds)
+    return time.perf_counter() - start
+
+class PasswordHasher:
+    # Runs bcrypt on a worker pool and sheds load once too many calls are queued.
+    def __init__(self, executor_kind: str, workers: int, max_pending: int):
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = pwd_context.handler("bcrypt").default_rounds
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+
+    def start(self):
+        if self._executor is None:
+            if self.executor_kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Authentication service busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.start(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_verify_password, password, hashed)
+
+    async def calibrate(self, target_ms: float):
+        # Best of a few samples, so a cold first run doesn't make the host look slower than it is.
+        loop = asyncio.get_running_loop()
+        elapsed = min([
+            await loop.run_in_executor(self.start(), _time_bcrypt, BCRYPT_MIN_ROUNDS)
+            for _ in range(max(1, BCRYPT_CALIBRATION_SAMPLES))
+        ])
+        extra = int(math.floor(math.log2(max(target_ms / 1000 / max(elapsed, 1e-6), 1))))
+        self.rounds = max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, BCRYPT_MIN_ROUNDS + extra))
+        return self.rounds
+
+password_hasher = PasswordHasher(PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def authenticate_token(token: str) -> dict:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.users.find_one({"email": email}, {"_id": 0})
+        user = user_cache.get(email)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
+            user = await db.users.find_one({"email": email}, {"_id": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache.set(email, user)
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate_token(credentials.credentials)
+
 class UserRegister(BaseModel):
     name: str
     email: EmailStr
@@ -151,13 +754,577 @@ class Message(BaseModel):
     reply: Optional[str] = None
     created_at: str
 
+REMINDER_INDEX_MAX_USERS = int(os.environ.get('REMINDER_INDEX_MAX_USERS', '10000'))
+REMINDER_INDEX_TTL_SECONDS = float(os.environ.get('REMINDER_INDEX_TTL_SECONDS', '300'))
+MAX_REMINDER_WINDOW_MINUTES = 7 * 24 * 60
+
+def _minute_of_day(value: str) -> Optional[int]:
+    try:
+        hours, minutes = value.split(":")[:2]
+        minute = int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+    return minute if 0 <= minute < 24 * 60 else None
+
+def _appointment_due(appt: dict) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(f"{appt['date']}T{appt['time']}").replace(tzinfo=timezone.utc)
+    except (KeyError, ValueError):
+        return None
+
+class UserSchedule:
+    def __init__(self):
+        self.dose_slots = []
+        self.medications = {}
+        self.appointment_slots = []
+        self.appointments = {}
+
+    def put_medication(self, med: dict):
+        self.remove_medication(med["id"])
+        self.medications[med["id"]] = {"name": med["name"], "dosage": med["dosage"]}
+        for time_str in med.get("times", []):
+            minute = _minute_of_day(time_str)
+            if minute is not None:
+                insort(self.dose_slots, (minute, med["id"], time_str))
+
+    def remove_medication(self, med_id: str):
+        if self.medications.pop(med_id, None) is not None:
+            self.dose_slots = [slot for slot in self.dose_slots if slot[1] != med_id]
+
+    def put_appointment(self, appt: dict):
+        self.remove_appointment(appt["id"])
+        due = _appointment_due(appt)
+        if due is None or appt.get("status") != "pending":
+            return
+        self.appointments[appt["id"]] = {"doctor_name": appt["doctor_name"], "appointment_type": appt["type"], "reason": appt.get("reason")}
+        insort(self.appointment_slots, (due, appt["id"]))
+
+    def remove_appointment(self, appt_id: str):
+        if self.appointments.pop(appt_id, None) is not None:
+            self.appointment_slots = [slot for slot in self.appointment_slots if slot[1] != appt_id]
+
+    def upcoming(self, now: datetime, window_minutes: int) -> List[dict]:
+        horizon = now + timedelta(minutes=window_minutes)
+        items = []
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        start_minute = now.hour * 60 + now.minute + (1 if now.second or now.microsecond else 0)
+        day = 0
+        while self.dose_slots and midnight + timedelta(days=day) <= horizon:
+            first = bisect_left(self.dose_slots, (start_minute,)) if day == 0 else 0
+            for minute, med_id, time_str in self.dose_slots[first:]:
+                due = midnight + timedelta(days=day, minutes=minute)
+                if due > horizon:
+                    break
+                items.append({"type": "medication", "medication_id": med_id, "time": time_str,
+                              "due_at": due.isoformat(), **self.medications[med_id]})
+            day += 1
+        
+        while self.appointment_slots and self.appointment_slots[0][0] < now:
+            _, appt_id = self.appointment_slots.pop(0)
+            self.appointments.pop(appt_id, None)
+        for due, appt_id in self.appointment_slots:
+            if due > horizon:
+                break
+            items.append({"type": "appointment", "appointment_id": appt_id, "due_at": due.isoformat(), **self.appointments[appt_id]})
+        items.sort(key=lambda item: item["due_at"])
+        return items
+
+class ReminderIndex:
+    # Per-user upcoming dose and appointment times, loaded once and kept current by the write handlers.
+    def __init__(self, max_users: int, ttl: float):
+        self._schedules = LoadingCache(max_users, ttl, self._load)
+
+    async def _load(self, email: str) -> UserSchedule:
+        schedule = UserSchedule()
+        meds, appts = await asyncio.gather(
+            db.medications.find({"user_email": email}, {"_id": 0, "id": 1, "name": 1, "dosage": 1, "times": 1}).to_list(None),
+            db.appointments.find({"user_email": email, "status": "pending"}, {"_id": 0}).to_list(None)
+        )
+        for med in meds:
+            schedule.put_medication(med)
+        for appt in appts:
+            schedule.put_appointment(appt)
+        return schedule
+
+    async def get(self, email: str) -> UserSchedule:
+        return await self._schedules.get(email)
+
+    def _loaded(self, email: str) -> Optional[UserSchedule]:
+        return self._schedules.peek(email)
+
+    def medication_saved(self, email: str, med: dict):
+        schedule = self._loaded(email)
+        if schedule is not None:
+            schedule.put_medication(med)
+
+    def medication_deleted(self, email: str, med_id: str):
+        schedule = self._loaded(email)
+        if schedule is not None:
+            schedule.remove_medication(med_id)
+
+    def appointment_saved(self, email: str, appt: dict):
+        schedule = self._loaded(email)
+        if schedule is not None:
+            schedule.put_appointment(appt)
+
+reminder_index = ReminderIndex(REMINDER_INDEX_MAX_USERS, REMINDER_INDEX_TTL_SECONDS)
+
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', '30'))
+CLINIC_OPEN = os.environ.get('CLINIC_OPEN', '09:00')
+CLINIC_CLOSE = os.environ.get('CLINIC_CLOSE', '17:00')
+AVAILABILITY_INDEX_MAX_DAYS = int(os.environ.get('AVAILABILITY_INDEX_MAX_DAYS', '50000'))
+AVAILABILITY_INDEX_TTL_SECONDS = float(os.environ.get('AVAILABILITY_INDEX_TTL_SECONDS', '60'))
+NON_BLOCKING_APPOINTMENT_STATUSES = {"cancelled", "rejected", "declined"}
+
+class DoctorDay:
+    def __init__(self):
+        self.bookings = []
+
+    def conflicts(self, minute: int, length: int = APPOINTMENT_SLOT_MINUTES) -> List[str]:
+        # Every booking has the same length, so anything overlapping [minute, minute + length)
+        # must start strictly inside (minute - length, minute + length).
+        first = bisect_left(self.bookings, (minute - length + 1,))
+        last = bisect_left(self.bookings, (minute + length,))
+        return [appt_id for _, appt_id in self.bookings[first:last]]
+
+    def add(self, minute: int, appt_id: str):
+        insort(self.bookings, (minute, appt_id))
+
+    def remove(self, appt_id: str):
+        self.bookings = [booking for booking in self.bookings if booking[1] != appt_id]
+
+    def open_slots(self, opens: int, closes: int, length: int = APPOINTMENT_SLOT_MINUTES) -> List[str]:
+        slots = []
+        position = 0
+        for start in range(opens, closes - length + 1, length):
+            while position < len(self.bookings) and self.bookings[position][0] + length <= start:
+                position += 1
+            if position < len(self.bookings) and self.bookings[position][0] < start + length:
+                continue
+            slots.append(f"{start // 60:02d}:{start % 60:02d}")
+        return slots
+
+class AvailabilityIndex:
+    # Sorted booking starts per (doctor, date), loaded on first use and updated by appointment writes.
+    def __init__(self, max_days: int, ttl: float):
+        self._days = LoadingCache(max_days, ttl, self._load)
+
+    async def _load(self, key: tuple) -> DoctorDay:
+        doctor_name, day = key
+        doctor_day = DoctorDay()
+        appts = await db.appointments.find(
+            {"doctor_name": doctor_name, "date": day, "status": {"$nin": list(NON_BLOCKING_APPOINTMENT_STATUSES)}},
+            {"_id": 0, "id": 1, "time": 1}
+        ).to_list(None)
+        for appt in appts:
+            minute = _minute_of_day(appt.get("time"))
+            if minute is not None:
+                doctor_day.add(minute, appt["id"])
+        return doctor_day
+
+    async def get(self, doctor_name: str, day: str) -> DoctorDay:
+        return await self._days.get((doctor_name, day))
+
+    def appointment_saved(self, appt: dict):
+        doctor_day = self._days.peek((appt["doctor_name"], appt["date"]))
+        if doctor_day is None:
+            return
+        doctor_day.remove(appt["id"])
+        minute = _minute_of_day(appt.get("time"))
+        if minute is not None and appt.get("status") not in NON_BLOCKING_APPOINTMENT_STATUSES:
+            doctor_day.add(minute, appt["id"])
+
+    async def confirm(self, appt: dict, minute: int) -> bool:
+        # Another worker's bookings only reach the cached day when it reloads, so re-read the day after
+        # inserting: the cached day learns about them, and any overlap means this booking must be rolled back.
+        key = (appt["doctor_name"], appt["date"])
+        fresh = await self._load(key)
+        fresh.remove(appt["id"])
+        clashing = fresh.conflicts(minute)
+        doctor_day = self._days.peek(key)
+        if doctor_day is not None:
+            known = {appt_id for _, appt_id in doctor_day.bookings}
+            for booking in fresh.bookings:
+                if booking[1] not in known:
+                    doctor_day.add(*booking)
+            if clashing:
+                doctor_day.remove(appt["id"])
+        return not clashing
+
+availability_index = AvailabilityIndex(AVAILABILITY_INDEX_MAX_DAYS, AVAILABILITY_INDEX_TTL_SECONDS)
+
+SEARCH_INDEX_MAX_USERS = int(os.environ.get('SEARCH_INDEX_MAX_USERS', '5000'))
+SEARCH_INDEX_REFRESH_SECONDS = float(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS', '30'))
+SEARCH_FIELDS = {
+    "message": ("messages", ("message", "reply")),
+    "medication": ("medications", ("name", "instructions")),
+    "appointment": ("appointments", ("reason", "doctor_name")),
+}
+SEARCH_KINDS = {collection: kind for kind, (collection, _) in SEARCH_FIELDS.items()}
+SEARCH_TOKEN = re.compile(r"\w+")
+
+def _search_terms(text: Optional[str]) -> List[str]:
+    return SEARCH_TOKEN.findall(text.lower()) if text else []
+
+class UserSearchIndex:
+    def __init__(self, seq: int = 0):
+        self.seq = seq
+        self.postings = {}
+        self.documents = {}
+
+    def put(self, kind: str, doc: dict):
+        key = (kind, doc["id"])
+        self.remove(key)
+        counts = {}
+        for field in SEARCH_FIELDS[kind][1]:
+            for term in _search_terms(doc.get(field)):
+                counts[term] = counts.get(term, 0) + 1
+        if not counts:
+            return
+        self.documents[key] = (doc, counts)
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[key] = count
+
+    def remove(self, key: tuple):
+        entry = self.documents.pop(key, None)
+        if entry is None:
+            return
+        for term in entry[1]:
+            posting = self.postings[term]
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[term]
+
+    def search(self, query: str) -> List[tuple]:
+        terms = set(_search_terms(query))
+        postings = [self.postings.get(term) for term in terms]
+        if not postings or not all(postings):
+            return []
+        # Walk the rarest term's postings and probe the rest, so the cost follows the match count.
+        postings.sort(key=len)
+        total = len(self.documents)
+        weights = [math.log(1 + total / len(posting)) for posting in postings]
+        hits = []
+        for key, count in postings[0].items():
+            score = count * weights[0]
+            for posting, weight in zip(postings[1:], weights[1:]):
+                other = posting.get(key)
+                if other is None:
+                    break
+                score += other * weight
+            else:
+                hits.append((score, key))
+        hits.sort(key=lambda hit: (hit[0], self.documents[hit[1]][0].get("created_at") or ""), reverse=True)
+        return hits
+
+class SearchIndex:
+    # Per-user inverted index over message, medication and appointment text. It is built once per user,
+    # kept current by this process's write handlers, and caught up on other workers' writes from the
+    # sync change log, so a refresh costs only as much as what changed.
+    def __init__(self, max_users: int, refresh_seconds: float):
+        self._indexes = LoadingCache(max_users, refresh_seconds, self._load, self._refresh)
+
+    async def _sync_state(self, email: str) -> dict:
+        return await db.users.find_one(
+            {"email": email}, {"_id": 0, "sync_seq": 1, "sync_floor": 1, "sync_pending": 1}
+        ) or {}
+
+    async def _load(self, email: str) -> UserSearchIndex:
+        index = UserSearchIndex(settled_sync_seq(await self._sync_state(email)))
+        kinds = list(SEARCH_FIELDS)
+        results = await asyncio.gather(*(
+            db[SEARCH_FIELDS[kind][0]].find({"user_email": email}, {"_id": 0, "user_email": 0}).to_list(None)
+            for kind in kinds
+        ))
+        for kind, docs in zip(kinds, results):
+            for doc in docs:
+                index.put(kind, doc)
+        return index
+
+    async def _refresh(self, email: str, index: UserSearchIndex) -> UserSearchIndex:
+        user = await self._sync_state(email)
+        if index.seq < user.get("sync_floor", 0):
+            # Tombstones we hadn't applied were compacted away; only a rebuild is safe.
+            return await self._load(email)
+        settled = settled_sync_seq(user)
+        if settled <= index.seq:
+            return index
+        entries = await db.change_log.find(
+            {"user_email": email, "seq": {"$gt": index.seq, "$lte": settled}},
+            {"_id": 0, "collection": 1, "doc_id": 1, "op": 1}
+        ).to_list(None)
+        upserts = {}
+        for entry in entries:
+            kind = SEARCH_KINDS.get(entry["collection"])
+            if kind is None:
+                continue
+            if entry["op"] == "delete":
+                index.remove((kind, entry["doc_id"]))
+            else:
+                upserts.setdefault(entry["collection"], []).append(entry["doc_id"])
+        collections = list(upserts)
+        results = await asyncio.gather(*(
+            db[collection].find({"user_email": email, "id": {"$in": upserts[collection]}}, {"_id": 0, "user_email": 0}).to_list(None)
+            for collection in collections
+        ))
+        for collection, docs in zip(collections, results):
+            for doc in docs:
+                index.put(SEARCH_KINDS[collection], doc)
+        index.seq = settled
+        return index
+
+    async def get(self, email: str) -> UserSearchIndex:
+        return await self._indexes.get(email)
+
+    def document_saved(self, email: str, kind: str, doc: dict):
+        index = self._indexes.peek(email)
+        if index is None:
+            return
+        # Partial updates keep the fields they don't touch, such as created_at.
+        previous = index.documents.get((kind, doc["id"]))
+        merged = {**(previous[0] if previous else {}), **doc}
+        index.put(kind, {key: value for key, value in merged.items() if key not in ("_id", "user_email")})
+
+    def document_deleted(self, email: str, kind: str, doc_id: str):
+        index = self._indexes.peek(email)
+        if index is not None:
+            index.remove((kind, doc_id))
+
+search_index = SearchIndex(SEARCH_INDEX_MAX_USERS, SEARCH_INDEX_REFRESH_SECONDS)
+
+async def bump_versions(email: str, *families: str, changes: tuple = ()):
+    # changes are (collection, doc_id, op) entries for the sync log; their sequence numbers
+    # are allocated by the same users update that bumps the ETag versions.
+    inc = {f"versions.{family}": 1 for family in families}
+    if not changes:
+        await db.users.update_one({"email": email}, {"$inc": inc})
+        user_cache.invalidate(email)
+        return
+    allocated = await allocate_sync_seq(db, email, len(changes), inc)
+    user_cache.invalidate(email)
+    if allocated is None:
+        return
+    first_seq, token = allocated
+    try:
+        await record_changes(db, email, first_seq, changes)
+    finally:
+        await db.users.update_one({"email": email}, {"$unset": {f"sync_pending.{token}": ""}})
+
+async def allocate_sync_seq(database, email: str, count: int, inc: dict) -> Optional[tuple]:
+    # A single pipeline update advances sync_seq and marks the allocated range pending, both computed on the
+    # server from the document's current value, so concurrent writers never collide or retry. /sync never
+    # hands out sequences at or past a pending one. Returns the first sequence and the pending marker's key.
+    token = uuid4().hex
+    previous_seq = {"$ifNull": ["$sync_seq", 0]}
+    fields = {
+        "sync_seq": {"$add": [previous_seq, count]},
+        f"sync_pending.{token}.seq": {"$add": [previous_seq, 1]},
+        f"sync_pending.{token}.at": time.time()
+    }
+    for field, amount in inc.items():
+        fields[field] = {"$add": [{"$ifNull": [f"${field}", 0]}, amount]}
+    user = await database.users.find_one_and_update({"email": email}, [{"$set": fields}], projection={"sync_seq": 1})
+    if user is None:
+        return None
+    return user.get("sync_seq", 0) + 1, token
+
+async def record_changes(database, email: str, first_seq: int, changes: tuple):
+    # One log entry per document holding its latest sequence number, so repeated edits compact themselves.
+    now = datetime.now(timezone.utc)
+    try:
+        await database.change_log.bulk_write([
+            UpdateOne(
+                {"user_email": email, "collection": collection, "doc_id": doc_id, "seq": {"$lt": first_seq + i}},
+                {"$set": {"seq": first_seq + i, "op": op, "at": now}},
+                upsert=True
+            )
+            for i, (collection, doc_id, op) in enumerate(changes)
+        ], ordered=False)
+    except BulkWriteError as e:
+        # A duplicate key here means a concurrent write already logged a newer sequence for that document.
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+
+async def current_versions(email: str) -> dict:
+    # Read straight from Mongo: the cached user can lag writes made through other workers.
+    user = await db.users.find_one({"email": email}, {"_id": 0, "versions": 1})
+    return (user or {}).get("versions") or {}
+
+def resource_etag(versions: dict, families: tuple, request: Request) -> str:
+    tag = ".".join(str(versions.get(family, 0)) for family in families)
+    return f'W/"{"+".join(families)}-{tag}-{zlib.crc32(request.url.query.encode()):08x}"'
+
+def check_not_modified(request: Request, response: Response, versions: dict, *families: str) -> Optional[Response]:
+    etag = resource_etag(versions, families, request)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', '100'))
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get('EVENT_HEARTBEAT_SECONDS', '15'))
+MAX_EVENT_CONNECTIONS_PER_USER = int(os.environ.get('MAX_EVENT_CONNECTIONS_PER_USER', '5'))
+
+class EventSubscriber:
+    def __init__(self, max_queue: int):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+class EventHub:
+    # In-process fan-out of per-user events to connected SSE clients.
+    def __init__(self, max_queue: int, max_per_user: int):
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.published = 0
+        self.dropped = 0
+        self._subscribers = {}
+
+    def subscribe(self, email: str) -> EventSubscriber:
+        subscribers = self._subscribers.setdefault(email, set())
+        if len(subscribers) >= self.max_per_user:
+            raise HTTPException(status_code=429, detail="Too many open event streams")
+        subscriber = EventSubscriber(self.max_queue)
+        subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, email: str, subscriber: EventSubscriber):
+        subscribers = self._subscribers.get(email)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[email]
+
+    def publish(self, email: str, event: str, data: dict):
+        for subscriber in self._subscribers.get(email, ()):
+            try:
+                subscriber.queue.put_nowait((event, data))
+                self.published += 1
+            except asyncio.QueueFull:
+                # A client this far behind is told to resync rather than silently losing events.
+                subscriber.overflowed = True
+                self.dropped += 1
+
+    def connection_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+event_hub = EventHub(EVENT_QUEUE_SIZE, MAX_EVENT_CONNECTIONS_PER_USER)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+EVENT_SOURCE_PIPELINE = [{"$match": {"operationType": "update", "$or": [
+    {"ns.coll": "messages", "updateDescription.updatedFields.reply": {"$exists": True}},
+    {"ns.coll": "appointments", "updateDescription.updatedFields.status": {"$exists": True}}
+]}}]
+EVENT_BOOKKEEPING_LEASE_ID = "event_bookkeeping"
+EVENT_BOOKKEEPING_LEASE_SECONDS = float(os.environ.get('EVENT_BOOKKEEPING_LEASE_SECONDS', '30'))
+
+async def _renew_lease(collection, lease_id: str, owner: str, seconds: float, fields: Optional[dict] = None) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        await collection.update_one(
+            {"_id": lease_id, "$or": [{"owner": owner}, {"lease_until": {"$lt": now}}, {"lease_until": None}]},
+            {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=seconds), **(fields or {})}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def watch_event_sources():
+    # Every worker follows these changes to update its own SSE clients and in-memory indexes;
+    # the shared database bookkeeping is done once, by record_event_sources.
+    resume_token = None
+    backoff = 1
+    while True:
+        try:
+            async with db.watch(EVENT_SOURCE_PIPELINE, full_document="updateLookup", resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    backoff = 1
+                    doc = change.get("fullDocument")
+                    if not doc or "user_email" not in doc:
+                        continue
+                    doc.pop("_id", None)
+                    if change["ns"]["coll"] == "messages":
+                        search_index.document_saved(doc["user_email"], "message", doc)
+                        event_hub.publish(doc["user_email"], "reply", doc)
+                    else:
+                        reminder_index.appointment_saved(doc["user_email"], doc)
+                        search_index.document_saved(doc["user_email"], "appointment", doc)
+                        availability_index.appointment_saved(doc)
+                        event_hub.publish(doc["user_email"], "appointment_status", doc)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in (40573, 40324):
+                logger.warning("Change streams unavailable, push events disabled: %s", e)
+                return
+            logger.error("Event change stream failed, retrying in %ds: %s", backoff, e)
+        except Exception as e:
+            logger.error("Event change stream failed, retrying in %ds: %s", backoff, e)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
+async def record_event_change(change: dict):
+    doc = change.get("fullDocument")
+    if not doc or "user_email" not in doc:
+        return
+    if change["ns"]["coll"] == "messages":
+        await bump_versions(doc["user_email"], changes=(("messages", doc["id"], "upsert"),))
+    else:
+        await bump_versions(doc["user_email"], "appointments", changes=(("appointments", doc["id"], "upsert"),))
+
+async def record_event_sources():
+    # Sync log, sequence and ETag bookkeeping for the same changes, run by whichever worker holds the
+    # lease. The lease document carries the resume token, so a new holder picks up where the last one stopped.
+    owner = str(uuid4())
+    backoff = 1
+    while True:
+        try:
+            if not await _renew_lease(db.leases, EVENT_BOOKKEEPING_LEASE_ID, owner, EVENT_BOOKKEEPING_LEASE_SECONDS):
+                await asyncio.sleep(EVENT_BOOKKEEPING_LEASE_SECONDS / 2)
+                continue
+            lease = await db.leases.find_one({"_id": EVENT_BOOKKEEPING_LEASE_ID}) or {}
+            renewed = time.monotonic()
+            async with db.watch(
+                EVENT_SOURCE_PIPELINE, full_document="updateLookup", resume_after=lease.get("resume_token"), max_await_time_ms=1000
+            ) as stream:
+                while stream.alive:
+                    change = await stream.try_next()
+                    if change is not None:
+                        backoff = 1
+                        await record_event_change(change)
+                    elif time.monotonic() - renewed < EVENT_BOOKKEEPING_LEASE_SECONDS / 3:
+                        continue
+                    if not await _renew_lease(db.leases, EVENT_BOOKKEEPING_LEASE_ID, owner, EVENT_BOOKKEEPING_LEASE_SECONDS,
+                                              {"resume_token": stream.resume_token}):
+                        break
+                    renewed = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code in (40573, 40324):
+                logger.warning("Change streams unavailable, event bookkeeping disabled: %s", e)
+                return
+            if e.code == 286:
+                # The saved resume token fell off the oplog; start again from now.
+                await db.leases.update_one({"_id": EVENT_BOOKKEEPING_LEASE_ID, "owner": owner}, {"$unset": {"resume_token": ""}})
+            logger.error("Event bookkeeping stream failed, retrying in %ds: %s", backoff, e)
+        except Exception as e:
+            logger.error("Event bookkeeping stream failed, retrying in %ds: %s", backoff, e)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 60)
+
 @api_router.post("/auth/register")
 async def register(user: UserRegister):
     existing = await db.users.find_one({"email": user.email})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     user_doc = {
         "name": user.name,
         "email": user.email,
@@ -167,7 +1334,12 @@ async def register(user: UserRegister):
         "diseases": [],
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same email.
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await bump_versions(user.email, changes=(("users", user.email, "upsert"),))
     
     token = create_access_token({"sub": user.email})
     return {"token": token, "email": user.email, "name": user.name}
@@ -175,15 +1347,25 @@ async def register(user: UserRegister):
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not pwd_context.verify(credentials.password, user["password"]):
+    if not user or not await password_hasher.verify(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     token = create_access_token({"sub": credentials.email})
     return {"token": token, "email": user["email"], "name": user["name"]}
 
 @api_router.get("/profile", response_model=UserProfile)
-async def get_profile(current_user: dict = Depends(get_current_user)):
-    return UserProfile(**current_user)
+async def get_profile(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    versions = await current_versions(current_user["email"])
+    not_modified = check_not_modified(request, response, versions, "profile")
+    if not_modified:
+        return not_modified
+    if (current_user.get("versions") or {}).get("profile", 0) == versions.get("profile", 0):
+        return UserProfile(**current_user)
+    # The cached user predates another worker's update; read the profile with the versions it was written at.
+    user = await db.users.find_one(
+        {"email": current_user["email"]}, {"_id": 0, **{field: 1 for field in UserProfile.model_fields}, "versions": 1}
+    ) or current_user
+    return check_not_modified(request, response, user.get("versions") or {}, "profile") or UserProfile(**user)
 
 @api_router.put("/profile")
 async def update_profile(profile: UserProfile, current_user: dict = Depends(get_current_user)):
@@ -196,29 +1378,46 @@ async def update_profile(profile: UserProfile, current_user: dict = Depends(get_
             "diseases": profile.diseases
         }}
     )
+    await bump_versions(current_user["email"], "profile", changes=(("users", current_user["email"], "upsert"),))
     return {"message": "Profile updated successfully"}
 
 @api_router.post("/medications", response_model=Medication)
-async def create_medication(med: MedicationCreate, current_user: dict = Depends(get_current_user)):
-    from uuid import uuid4
-    med_id = str(uuid4())
-    med_doc = {
-        "id": med_id,
-        "user_email": current_user["email"],
-        "name": med.name,
-        "dosage": med.dosage,
-        "frequency": med.frequency,
-        "times": med.times,
-        "instructions": med.instructions,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.medications.insert_one(med_doc)
-    return Medication(**med_doc)
+async def create_medication(med: MedicationCreate, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    async with IdempotentRequest(request, current_user, "create_medication", med) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        med_id = str(uuid4())
+        med_doc = {
+            "id": med_id,
+            "user_email": current_user["email"],
+            "name": med.name,
+            "dosage": med.dosage,
+            "frequency": med.frequency,
+            "times": med.times,
+            "instructions": med.instructions,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        await db.medications.insert_one(med_doc)
+        reminder_index.medication_saved(current_user["email"], med_doc)
+        search_index.document_saved(current_user["email"], "medication", med_doc)
+        await bump_versions(current_user["email"], "medications", changes=(("medications", med_id, "upsert"),))
+        idem.result = {field: med_doc.get(field) for field in Medication.model_fields}
+        return model_response(Medication, med_doc, response)
 
 @api_router.get("/medications", response_model=List[Medication])
-async def get_medications(current_user: dict = Depends(get_current_user)):
-    meds = await db.medications.find({"user_email": current_user["email"]}, {"_id": 0}).to_list(1000)
-    return [Medication(**med) for med in meds]
+async def get_medications(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if not stream:
+        not_modified = check_not_modified(request, response, await current_versions(current_user["email"]), "medications")
+        if not_modified:
+            return not_modified
+    return await list_documents(db.medications, {"user_email": current_user["email"]}, Medication, response, limit, after, stream)
 
 @api_router.put("/medications/{med_id}")
 async def update_medication(med_id: str, med: MedicationCreate, current_user: dict = Depends(get_current_user)):
@@ -228,6 +1427,9 @@ async def update_medication(med_id: str, med: MedicationCreate, current_user: di
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Medication not found")
+    reminder_index.medication_saved(current_user["email"], {"id": med_id, **med.model_dump()})
+    search_index.document_saved(current_user["email"], "medication", {"id": med_id, **med.model_dump()})
+    await bump_versions(current_user["email"], "medications", changes=(("medications", med_id, "upsert"),))
     return {"message": "Medication updated successfully"}
 
 @api_router.delete("/medications/{med_id}")
@@ -235,20 +1437,175 @@ async def delete_medication(med_id: str, current_user: dict = Depends(get_curren
     result = await db.medications.delete_one({"id": med_id, "user_email": current_user["email"]})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Medication not found")
+    reminder_index.medication_deleted(current_user["email"], med_id)
+    search_index.document_deleted(current_user["email"], "medication", med_id)
+    await bump_versions(current_user["email"], "medications", changes=(("medications", med_id, "delete"),))
     return {"message": "Medication deleted successfully"}
 
-@api_router.post("/tracker/medication")
-async def track_medication(tracker: DailyTrackerCreate, current_user: dict = Depends(get_current_user)):
-    from uuid import uuid4
-    med = await db.medications.find_one({"id": tracker.medication_id, "user_email": current_user["email"]}, {"_id": 0})
-    if not med:
-        raise HTTPException(status_code=404, detail="Medication not found")
-    
-    today = datetime.now(timezone.utc).date().isoformat()
-    tracker_doc = {
+def _rollup_buckets(day_str: str):
+    day = date.fromisoformat(day_str)
+    return [("day", day.isoformat()), ("week", day.strftime("%G-W%V")), ("month", day.strftime("%Y-%m"))]
+
+def _bucket_key(granularity: str, day: date) -> str:
+    return dict(_rollup_buckets(day.isoformat()))[granularity]
+
+def _bucket_span(granularity: str, day: date):
+    # First and last day of the rollup bucket holding day.
+    if granularity == "week":
+        first = day - timedelta(days=day.isoweekday() - 1)
+        return first, first + timedelta(days=6)
+    if granularity == "month":
+        first = day.replace(day=1)
+        return first, (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return day, day
+
+async def record_adherence(database, tracker_docs: List[dict], sign: int = 1):
+    # sign=-1 takes events back out of the rollups, for events that were removed.
+    increments = {}
+    names = {}
+    for doc in tracker_docs:
+        names[doc["medication_id"]] = doc["medication_name"]
+        for granularity, bucket in _rollup_buckets(doc["date"]):
+            key = (doc["user_email"], doc["medication_id"], granularity, bucket)
+            counts = increments.setdefault(key, {"taken": 0, "missed": 0, "events": 0})
+            counts["taken"] += sign * int(doc["taken"])
+            counts["missed"] += sign * int(doc["missed"])
+            counts["events"] += sign
+    ops = [
+        UpdateOne(
+            {"user_email": user_email, "medication_id": medication_id, "granularity": granularity, "bucket": bucket},
+            {"$inc": counts, "$set": {"medication_name": names[medication_id]}},
+            upsert=True
+        )
+        for (user_email, medication_id, granularity, bucket), counts in increments.items()
+    ]
+    if ops:
+        await database.adherence_rollups.bulk_write(ops, ordered=False)
+
+def _matched_slot(times: List[str], doc: dict) -> Optional[str]:
+    # The dose slot expand_schedule would match this event to: the nearest of the medication's times
+    # on the event's day or either neighbour, the earlier one on a tie. Returned as "YYYY-MM-DDTHH:MM".
+    day = date.fromisoformat(doc["date"])
+    minute = _minute_of_day((doc.get("scheduled_time") or "")[11:16]) or 0
+    slots = sorted(
+        (offset * 1440 + slot_minute, offset, slot_minute)
+        for offset in (-1, 0, 1) for slot_minute in map(_minute_of_day, times) if slot_minute is not None
+    )
+    if not slots:
+        return None
+    _, offset, slot_minute = min(slots, key=lambda slot: abs(slot[0] - minute))
+    return f"{(day + timedelta(days=offset)).isoformat()}T{slot_minute // 60:02d}:{slot_minute % 60:02d}"
+
+async def supersede_swept_doses(database, email: str, docs: List[dict], meds_by_id: dict) -> int:
+    # A dose logged as taken after the sweeper already marked its slot missed replaces the sweeper's event,
+    # so the slot isn't counted as both taken and missed.
+    slots = {
+        (doc["medication_id"], slot) for doc in docs if doc["taken"] and doc["medication_id"] in meds_by_id
+        for slot in [_matched_slot(meds_by_id[doc["medication_id"]].get("times", []), doc)] if slot is not None
+    }
+    if not slots:
+        return 0
+    days = sorted(slot[:10] for _, slot in slots)
+    events = await find_tracker_events(database, email, days[0], days[-1])
+    removed = []
+    for event in events:
+        if event.get("source") != "sweeper" or not event.get("missed") or event.get("taken"):
+            continue
+        if (event["medication_id"], (event.get("scheduled_time") or "")[:16]) not in slots:
+            continue
+        # Removed one at a time so concurrent requests for the same slot only take it back out once.
+        if TRACKER_STORAGE != "buckets":
+            result = await database.daily_tracker.delete_one({"user_email": email, "id": event["id"]})
+            if result.deleted_count:
+                removed.append(event)
+        else:
+            result = await database.daily_tracker_buckets.update_one(
+                {"user_email": email, "month": event["date"][:7], "events.id": event["id"]},
+                {"$pull": {"events": {"id": event["id"]}}, "$inc": {"count": -1}}
+            )
+            if result.modified_count:
+                removed.append(event)
+    await record_adherence(database, [{**event, "user_email": email} for event in removed], sign=-1)
+    return len(removed)
+
+MAX_ADHERENCE_DAYS = int(os.environ.get('MAX_ADHERENCE_DAYS', '1830'))
+
+def _days_between(start: date, end: date) -> List[str]:
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+def _cover_range(start: date, end: date):
+    # Whole calendar months inside the range use month buckets, the ragged edges use day buckets.
+    months, days = [], []
+    current = start
+    while current <= end:
+        next_month = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+        if current.day == 1 and next_month - timedelta(days=1) <= end:
+            months.append(current.strftime("%Y-%m"))
+            current = next_month
+        else:
+            days.append(current.isoformat())
+            current += timedelta(days=1)
+    return months, days
+
+async def rebuild_adherence_rollups(database, user_email: Optional[str] = None) -> int:
+    match = {"user_email": user_email} if user_email else {}
+    source, stages = tracker_event_source(database, match)
+    pipeline = stages + [
+        {"$group": {
+            "_id": {"user_email": "$user_email", "medication_id": "$medication_id", "date": "$date"},
+            "medication_name": {"$last": "$medication_name"},
+            "taken": {"$sum": {"$cond": ["$taken", 1, 0]}},
+            "missed": {"$sum": {"$cond": ["$missed", 1, 0]}},
+            "events": {"$sum": 1}
+        }},
+        {"$sort": {"_id.user_email": 1}}
+    ]
+
+    async def flush(email, buckets):
+        await database.adherence_rollups.delete_many({"user_email": email})
+        ops = [
+            UpdateOne(
+                {"user_email": email, "medication_id": medication_id, "granularity": granularity, "bucket": bucket},
+                {"$set": counts},
+                upsert=True
+            )
+            for (medication_id, granularity, bucket), counts in buckets.items()
+        ]
+        if ops:
+            await database.adherence_rollups.bulk_write(ops, ordered=False)
+
+    users = 0
+    current_email = None
+    buckets = {}
+    async for group in source.aggregate(pipeline, allowDiskUse=True):
+        key = group["_id"]
+        if key["user_email"] != current_email:
+            if current_email is not None:
+                await flush(current_email, buckets)
+                users += 1
+            current_email = key["user_email"]
+            buckets = {}
+        for granularity, bucket in _rollup_buckets(key["date"]):
+            counts = buckets.setdefault(
+                (key["medication_id"], granularity, bucket),
+                {"taken": 0, "missed": 0, "events": 0, "medication_name": group["medication_name"]}
+            )
+            counts["taken"] += group["taken"]
+            counts["missed"] += group["missed"]
+            counts["events"] += group["events"]
+    if current_email is not None:
+        await flush(current_email, buckets)
+        users += 1
+    return users
+
+def _adherence_summary(taken: int, missed: int) -> Optional[float]:
+    return round(taken / (taken + missed), 4) if taken + missed else None
+
+def build_tracker_doc(tracker: DailyTrackerCreate, med: dict, user_email: str) -> dict:
+    return {
         "id": str(uuid4()),
-        "user_email": current_user["email"],
-        "date": today,
+        "user_email": user_email,
+        "date": datetime.now(timezone.utc).date().isoformat(),
         "medication_id": tracker.medication_id,
         "medication_name": med["name"],
         "scheduled_time": tracker.taken_at or datetime.now(timezone.utc).isoformat(),
@@ -256,116 +1613,1320 @@ async def track_medication(tracker: DailyTrackerCreate, current_user: dict = Dep
         "taken_at": tracker.taken_at,
         "missed": tracker.missed
     }
-    await db.daily_tracker.insert_one(tracker_doc)
-    return {"message": "Medication tracked successfully"}
+
+TRACKER_STORAGE = os.environ.get('TRACKER_STORAGE', 'documents')
+TRACKER_BUCKET_SIZE = int(os.environ.get('TRACKER_BUCKET_SIZE', '500'))
+
+# With TRACKER_STORAGE=buckets, dose events live in daily_tracker_buckets as
+# {user_email, month, count, events: [...]} documents of up to TRACKER_BUCKET_SIZE events.
+def _bucket_event(doc: dict) -> dict:
+    return {key: value for key, value in doc.items() if key not in ("_id", "user_email")}
+
+async def insert_tracker_events(database, docs: List[dict]) -> dict:
+    if not docs:
+        return {}
+    if TRACKER_STORAGE != "buckets":
+        try:
+            await database.daily_tracker.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            return {error["index"]: error.get("errmsg", "Write failed") for error in e.details.get("writeErrors", [])}
+        return {}
+    grouped = {}
+    for doc in docs:
+        grouped.setdefault((doc["user_email"], doc["date"][:7]), []).append(_bucket_event(doc))
+    await push_bucket_events(database, grouped)
+    return {}
+
+async def push_bucket_events(database, grouped: dict):
+    # Each chunk goes to a bucket with room for all of it, or upserts a new one.
+    await database.daily_tracker_buckets.bulk_write([
+        UpdateOne(
+            {"user_email": email, "month": month, "count": {"$lte": TRACKER_BUCKET_SIZE - len(chunk)}},
+            {"$push": {"events": {"$each": chunk}}, "$inc": {"count": len(chunk)}},
+            upsert=True
+        )
+        for (email, month), events in grouped.items()
+        for chunk in (events[i:i + TRACKER_BUCKET_SIZE] for i in range(0, len(events), TRACKER_BUCKET_SIZE))
+    ], ordered=False)
+
+async def find_tracker_events(database, email: str, start: str, end: str) -> List[dict]:
+    if TRACKER_STORAGE != "buckets":
+        date_filter = start if start == end else {"$gte": start, "$lte": end}
+        return await database.daily_tracker.find({"user_email": email, "date": date_filter}, {"_id": 0}).to_list(None)
+    events = await database.daily_tracker_buckets.aggregate([
+        {"$match": {"user_email": email, "month": {"$gte": start[:7], "$lte": end[:7]}}},
+        {"$unwind": "$events"},
+        {"$replaceRoot": {"newRoot": "$events"}},
+        {"$match": {"date": {"$gte": start, "$lte": end}}}
+    ]).to_list(None)
+    for event in events:
+        event["user_email"] = email
+    return events
+
+async def iter_tracker_events(database, email: str, batch_size: int = 500):
+    if TRACKER_STORAGE != "buckets":
+        cursor = database.daily_tracker.find({"user_email": email}, {"_id": 0}).sort("_id", ASCENDING).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc
+        return
+    cursor = database.daily_tracker_buckets.find({"user_email": email}, {"_id": 0, "events": 1}).sort([("month", ASCENDING), ("_id", ASCENDING)])
+    async for bucket in cursor.batch_size(max(1, batch_size // TRACKER_BUCKET_SIZE)):
+        for event in bucket["events"]:
+            yield {"user_email": email, **event}
+
+def tracker_event_source(database, match: dict):
+    if TRACKER_STORAGE != "buckets":
+        return database.daily_tracker, [{"$match": match}]
+    return database.daily_tracker_buckets, [
+        {"$match": match},
+        {"$unwind": "$events"},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$events", {"user_email": "$user_email"}]}}}
+    ]
+
+def tracker_events_for_users(database, emails: List[str], start: str, end: Optional[str] = None):
+    end = end or start
+    by_user = {"user_email": {"$in": emails}}
+    date_filter = start if start == end else {"$gte": start, "$lte": end}
+    if TRACKER_STORAGE != "buckets":
+        match = {**by_user, "date": date_filter}
+    else:
+        match = {**by_user, "month": start[:7] if start[:7] == end[:7] else {"$gte": start[:7], "$lte": end[:7]}}
+    source, stages = tracker_event_source(database, match)
+    return source, stages + [{"$match": {"date": date_filter}}, {"$project": {"_id": 0}}, {"$sort": {"user_email": 1}}]
+
+async def migrate_tracker_to_buckets(database, user_email: Optional[str] = None, drop_source: bool = False) -> dict:
+    # Works one (user, month) at a time and merges by event id, so it is safe to re-run after
+    # TRACKER_STORAGE=buckets is live: events the service already bucketed are left alone.
+    match = {"user_email": user_email} if user_email else {}
+    stats = {"users": 0, "events": 0, "skipped": 0, "dropped": 0}
+    current = None
+    docs = []
+
+    async def flush():
+        if not docs:
+            return
+        email, month = current
+        existing = await database.daily_tracker_buckets.aggregate([
+            {"$match": {"user_email": email, "month": month}},
+            {"$unwind": "$events"},
+            {"$project": {"_id": 0, "id": "$events.id"}}
+        ]).to_list(None)
+        seen = {event.get("id") for event in existing}
+        fresh = [_bucket_event(doc) for doc in docs if doc.get("id") is None or doc["id"] not in seen]
+        if fresh:
+            await push_bucket_events(database, {current: fresh})
+        stats["events"] += len(fresh)
+        stats["skipped"] += len(docs) - len(fresh)
+        if drop_source:
+            # Only the documents read in this pass, all of which are now in a bucket.
+            result = await database.daily_tracker.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+            stats["dropped"] += result.deleted_count
+        docs.clear()
+
+    cursor = database.daily_tracker.find(match).sort([("user_email", ASCENDING), ("date", ASCENDING)])
+    async for doc in cursor.batch_size(1000):
+        key = (doc["user_email"], doc["date"][:7])
+        if key != current:
+            await flush()
+            if current is None or key[0] != current[0]:
+                stats["users"] += 1
+            current = key
+        docs.append(doc)
+    await flush()
+    return stats
+
+@api_router.post("/tracker/medication")
+async def track_medication(tracker: DailyTrackerCreate, request: Request, current_user: dict = Depends(get_current_user)):
+    async with IdempotentRequest(request, current_user, "track_medication", tracker) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        med = await db.medications.find_one({"id": tracker.medication_id, "user_email": current_user["email"]}, {"_id": 0})
+        if not med:
+            raise HTTPException(status_code=404, detail="Medication not found")
+    
+        tracker_doc = build_tracker_doc(tracker, med, current_user["email"])
+        failures = await insert_tracker_events(db, [tracker_doc])
+        if failures:
+            raise HTTPException(status_code=500, detail="Could not record medication")
+        await record_adherence(db, [tracker_doc])
+        await supersede_swept_doses(db, current_user["email"], [tracker_doc], {med["id"]: med})
+        idem.result = {"message": "Medication tracked successfully"}
+        return idem.result
+
+@api_router.post("/tracker/medication/batch")
+async def track_medication_batch(trackers: List[DailyTrackerCreate], request: Request, current_user: dict = Depends(get_current_user)):
+    async with IdempotentRequest(request, current_user, "track_medication_batch", trackers) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        if len(trackers) > MAX_TRACKER_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_TRACKER_BATCH_SIZE} events")
+    
+        med_ids = list({t.medication_id for t in trackers})
+        meds = await db.medications.find(
+            {"user_email": current_user["email"], "id": {"$in": med_ids}},
+            {"_id": 0, "id": 1, "name": 1, "times": 1}
+        ).to_list(len(med_ids))
+        meds_by_id = {med["id"]: med for med in meds}
+    
+        results = []
+        docs = []
+        doc_positions = []
+        for index, tracker in enumerate(trackers):
+            med = meds_by_id.get(tracker.medication_id)
+            if med is None:
+                results.append({"index": index, "status": "error", "detail": "Medication not found"})
+                continue
+            tracker_doc = build_tracker_doc(tracker, med, current_user["email"])
+            results.append({"index": index, "status": "ok", "id": tracker_doc["id"]})
+            doc_positions.append(index)
+            docs.append(tracker_doc)
+    
+        if docs:
+            failures = await insert_tracker_events(db, docs)
+            for position, detail in failures.items():
+                index = doc_positions[position]
+                results[index] = {"index": index, "status": "error", "detail": detail}
+            inserted = [doc for position, doc in enumerate(docs) if position not in failures]
+            await record_adherence(db, inserted)
+            await supersede_swept_doses(db, current_user["email"], inserted, meds_by_id)
+    
+        tracked = sum(1 for result in results if result["status"] == "ok")
+        idem.result = {"tracked": tracked, "failed": len(results) - tracked, "results": results}
+        return idem.result
 
 @api_router.get("/tracker/today")
 async def get_today_tracker(current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).date().isoformat()
-    trackers = await db.daily_tracker.find(
-        {"user_email": current_user["email"], "date": today},
-        {"_id": 0}
-    ).to_list(1000)
+    day_filter = {"user_email": current_user["email"], "date": today}
+    trackers, water, lunch = await asyncio.gather(
+        find_tracker_events(db, current_user["email"], today, today),
+        db.water_intake.find_one(day_filter, {"_id": 0, "glasses": 1}),
+        db.lunch_tracker.find_one(day_filter, {"_id": 0, "eaten": 1})
+    )
+    if TRACKER_WRITE_BEHIND:
+        water = tracker_buffer.get("water_intake", current_user["email"], today) or water
+        lunch = tracker_buffer.get("lunch_tracker", current_user["email"], today) or lunch
     
-    water = await db.water_intake.find_one(
-        {"user_email": current_user["email"], "date": today},
-        {"_id": 0}
-    ) or {"glasses": 0}
+    return {
+        "medications": trackers,
+        "water": (water or {}).get("glasses", 0),
+        "lunch": (lunch or {}).get("eaten", False)
+    }
+
+@api_router.get("/adherence")
+async def get_adherence(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    granularity: Optional[str] = Query(None, pattern="^(day|week|month)$"),
+    medication_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        start_date = date.fromisoformat(start)
+        end_date = date.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (end_date - start_date).days >= MAX_ADHERENCE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be at most {MAX_ADHERENCE_DAYS} days")
     
-    lunch = await db.lunch_tracker.find_one(
-        {"user_email": current_user["email"], "date": today},
+    base_query = {"user_email": current_user["email"]}
+    if medication_id:
+        base_query["medication_id"] = medication_id
+    months, days = _cover_range(start_date, end_date)
+    rollups = await db.adherence_rollups.find(
+        {**base_query, "$or": [
+            {"granularity": "month", "bucket": {"$in": months}},
+            {"granularity": "day", "bucket": {"$in": days}}
+        ]},
         {"_id": 0}
-    ) or {"eaten": False}
+    ).to_list(None)
     
-    return {
-        "medications": trackers,
-        "water": water.get("glasses", 0),
-        "lunch": lunch.get("eaten", False)
+    per_medication = {}
+    for rollup in rollups:
+        entry = per_medication.setdefault(rollup["medication_id"], {
+            "medication_id": rollup["medication_id"],
+            "medication_name": rollup.get("medication_name"),
+            "taken": 0,
+            "missed": 0,
+            "events": 0
+        })
+        for field in ("taken", "missed", "events"):
+            entry[field] += rollup.get(field, 0)
+    for entry in per_medication.values():
+        entry["adherence"] = _adherence_summary(entry["taken"], entry["missed"])
+    taken = sum(entry["taken"] for entry in per_medication.values())
+    missed = sum(entry["missed"] for entry in per_medication.values())
+    
+    result = {
+        "from": start_date.isoformat(),
+        "to": end_date.isoformat(),
+        "medications": list(per_medication.values()),
+        "taken": taken,
+        "missed": missed,
+        "adherence": _adherence_summary(taken, missed)
     }
+    if granularity:
+        result["series"] = await adherence_series(base_query, granularity, start_date, end_date)
+    return result
+
+async def adherence_series(base_query: dict, granularity: str, start_date: date, end_date: date) -> List[dict]:
+    # A week or month that is only partly inside the range is rebuilt from its day buckets,
+    # so the series adds up to the range totals.
+    edge_days = set()
+    first, last = _bucket_span(granularity, start_date)
+    if first < start_date:
+        edge_days.update(_days_between(start_date, min(last, end_date)))
+    first, last = _bucket_span(granularity, end_date)
+    if last > end_date:
+        edge_days.update(_days_between(max(first, start_date), end_date))
+    edge_buckets = {_bucket_key(granularity, date.fromisoformat(day)) for day in edge_days}
+    series = await db.adherence_rollups.find(
+        {**base_query, "granularity": granularity, "bucket": {
+            "$gte": _bucket_key(granularity, start_date),
+            "$lte": _bucket_key(granularity, end_date),
+            "$nin": list(edge_buckets)
+        }},
+        {"_id": 0, "user_email": 0, "granularity": 0}
+    ).to_list(None)
+    if edge_days:
+        day_rollups = await db.adherence_rollups.find(
+            {**base_query, "granularity": "day", "bucket": {"$in": sorted(edge_days)}}, {"_id": 0}
+        ).to_list(None)
+        edges = {}
+        for rollup in day_rollups:
+            bucket = _bucket_key(granularity, date.fromisoformat(rollup["bucket"]))
+            entry = edges.setdefault((rollup["medication_id"], bucket), {
+                "medication_id": rollup["medication_id"],
+                "bucket": bucket,
+                "medication_name": rollup.get("medication_name"),
+                "taken": 0,
+                "missed": 0,
+                "events": 0
+            })
+            for field in ("taken", "missed", "events"):
+                entry[field] += rollup.get(field, 0)
+        series.extend(edges.values())
+    series.sort(key=lambda entry: (entry["bucket"], entry["medication_id"]))
+    return series
+
+MAX_SCHEDULE_DAYS = int(os.environ.get('MAX_SCHEDULE_DAYS', '366'))
+SCHEDULE_GRACE_MINUTES = int(os.environ.get('SCHEDULE_GRACE_MINUTES', '60'))
+SCHEDULE_STATUSES = np.array(["upcoming", "missed", "taken"])
+
+def expand_schedule(meds: List[dict], events: List[dict], start_date: date, end_date: date, now: datetime) -> List[dict]:
+    # One row per (medication, time) pair, then every day x pair in one broadcast. The range is padded
+    # by a day on each side so a dose taken just after midnight still matches the previous evening's slot;
+    # callers should pass tracker events for the padded range too.
+    pairs = [(i, minute, time_str) for i, med in enumerate(meds)
+             for time_str in med.get("times", []) for minute in [_minute_of_day(time_str)] if minute is not None]
+    if not pairs:
+        return []
+    first_day = start_date - timedelta(days=1)
+    pair_med = np.array([pair[0] for pair in pairs], dtype=np.int64)
+    pair_minute = np.array([pair[1] for pair in pairs], dtype=np.int64)
+    days = np.arange(np.datetime64(first_day), np.datetime64(end_date) + 2, dtype="datetime64[D]")
+    day_idx = np.repeat(np.arange(len(days)), len(pairs))
+    slot_pair = np.tile(np.arange(len(pairs)), len(days))
+    slot_med = pair_med[slot_pair]
+    slot_minute = pair_minute[slot_pair]
+    
+    # Medications don't have doses before the day they were added.
+    created = np.array([
+        np.datetime64((med.get("created_at") or first_day.isoformat())[:10], "D") for med in meds
+    ])
+    keep = days[day_idx] >= created[slot_med]
+    day_idx, slot_pair, slot_med, slot_minute = day_idx[keep], slot_pair[keep], slot_med[keep], slot_minute[keep]
+    if not len(day_idx):
+        return []
+    
+    # Sort slots by (medication, absolute minute) so each tracker event finds the nearest dose of the
+    # same medication, on whichever day, with one searchsorted.
+    span = len(days) * 1440
+    slot_key = slot_med * span + day_idx * 1440 + slot_minute
+    order = np.argsort(slot_key, kind="stable")
+    day_idx, slot_pair, slot_med, slot_minute, slot_key = (
+        day_idx[order], slot_pair[order], slot_med[order], slot_minute[order], slot_key[order]
+    )
+    
+    taken = np.zeros(len(slot_key), dtype=bool)
+    reported_missed = np.zeros(len(slot_key), dtype=bool)
+    med_index = {med["id"]: i for i, med in enumerate(meds)}
+    rows = []
+    for event in events:
+        med = med_index.get(event.get("medication_id"))
+        if med is None or not event.get("date"):
+            continue
+        offset = (date.fromisoformat(event["date"]) - first_day).days
+        if not 0 <= offset < len(days):
+            continue
+        minute = _minute_of_day((event.get("scheduled_time") or "")[11:16])
+        rows.append((med, offset * 1440 + (0 if minute is None else minute), bool(event.get("taken")), bool(event.get("missed"))))
+    if rows:
+        event_med = np.array([row[0] for row in rows], dtype=np.int64)
+        event_key = event_med * span + np.array([row[1] for row in rows], dtype=np.int64)
+        right = np.clip(np.searchsorted(slot_key, event_key), 0, len(slot_key) - 1)
+        left = np.clip(right - 1, 0, len(slot_key) - 1)
+        # Prefer whichever neighbour belongs to the same medication and is closer in time.
+        left_ok = slot_med[left] == event_med
+        right_ok = slot_med[right] == event_med
+        use_left = left_ok & (~right_ok | (np.abs(event_key - slot_key[left]) <= np.abs(slot_key[right] - event_key)))
+        matched = np.where(use_left, left, right)
+        valid = left_ok | right_ok
+        event_taken = np.array([row[2] for row in rows]) & valid
+        event_missed = np.array([row[3] for row in rows]) & valid
+        taken[matched[event_taken]] = True
+        reported_missed[matched[event_missed]] = True
+    
+    first_minute = int((np.datetime64(first_day) - np.datetime64("1970-01-01")).astype(np.int64)) * 1440
+    due = first_minute + day_idx * 1440 + slot_minute
+    now_minute = int(now.timestamp() // 60)
+    overdue = reported_missed | (due + SCHEDULE_GRACE_MINUTES < now_minute)
+    status = SCHEDULE_STATUSES[np.where(taken, 2, np.where(overdue, 1, 0))]
+    reported = taken | reported_missed
+    
+    # Drop the padding days and return slots in (day, time) order.
+    inside = (day_idx >= 1) & (day_idx <= len(days) - 2)
+    order = np.lexsort((slot_pair[inside], day_idx[inside]))
+    day_strings = days.astype(str).tolist()
+    return [
+        {"date": day_strings[d], "time": pairs[p][2], "medication_id": meds[m]["id"],
+         "medication_name": meds[m]["name"], "dosage": meds[m].get("dosage"), "status": s, "reported": r}
+        for d, p, m, s, r in zip(
+            day_idx[inside][order].tolist(), slot_pair[inside][order].tolist(), slot_med[inside][order].tolist(),
+            status[inside][order].tolist(), reported[inside][order].tolist()
+        )
+    ]
+
+@api_router.get("/schedule")
+async def get_schedule(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        start_date = date.fromisoformat(start)
+        end_date = date.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if (end_date - start_date).days >= MAX_SCHEDULE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be at most {MAX_SCHEDULE_DAYS} days")
+    
+    meds, events = await asyncio.gather(
+        db.medications.find(
+            {"user_email": current_user["email"]},
+            {"_id": 0, "id": 1, "name": 1, "dosage": 1, "times": 1, "created_at": 1}
+        ).to_list(None),
+        find_tracker_events(db, current_user["email"], (start_date - timedelta(days=1)).isoformat(), (end_date + timedelta(days=1)).isoformat())
+    )
+    slots = expand_schedule(meds, events, start_date, end_date, datetime.now(timezone.utc))
+    counts = {status: 0 for status in SCHEDULE_STATUSES.tolist()}
+    for slot in slots:
+        counts[slot["status"]] += 1
+    return ORJSONResponse({"from": start_date.isoformat(), "to": end_date.isoformat(), **counts, "slots": slots})
+
+MISSED_DOSE_SWEEP = os.environ.get('MISSED_DOSE_SWEEP', 'false').lower() == 'true'
+MISSED_DOSE_SWEEP_INTERVAL_SECONDS = float(os.environ.get('MISSED_DOSE_SWEEP_INTERVAL_SECONDS', '900'))
+MISSED_DOSE_SWEEP_BATCH_USERS = int(os.environ.get('MISSED_DOSE_SWEEP_BATCH_USERS', '500'))
+MISSED_DOSE_SWEEP_CONCURRENCY = int(os.environ.get('MISSED_DOSE_SWEEP_CONCURRENCY', '4'))
+MISSED_DOSE_SWEEP_LEASE_SECONDS = float(os.environ.get('MISSED_DOSE_SWEEP_LEASE_SECONDS', '300'))
+MISSED_DOSE_CHECKPOINT_ID = "missed_dose_sweep"
+
+async def _sweep_missed_batch(database, emails: List[str], day: date, as_of: datetime) -> int:
+    day_str = day.isoformat()
+    source, pipeline = tracker_events_for_users(
+        database, emails, (day - timedelta(days=1)).isoformat(), (day + timedelta(days=1)).isoformat()
+    )
+    meds, events = await asyncio.gather(
+        database.medications.find(
+            {"user_email": {"$in": emails}},
+            {"_id": 0, "id": 1, "user_email": 1, "name": 1, "times": 1, "created_at": 1}
+        ).to_list(None),
+        source.aggregate(pipeline).to_list(None)
+    )
+    meds_by_user, events_by_user = {}, {}
+    for med in meds:
+        meds_by_user.setdefault(med["user_email"], []).append(med)
+    for event in events:
+        events_by_user.setdefault(event["user_email"], []).append(event)
+    
+    docs = []
+    for email, user_meds in meds_by_user.items():
+        created = {med["id"]: med.get("created_at") or "" for med in user_meds}
+        for slot in expand_schedule(user_meds, events_by_user.get(email, []), day, day, as_of):
+            if slot["status"] != "missed" or slot["reported"]:
+                continue
+            minute = _minute_of_day(slot["time"])
+            scheduled = f"{day_str}T{minute // 60:02d}:{minute % 60:02d}:00+00:00"
+            # Doses due before the medication was added were never expected.
+            if scheduled[:16] < created[slot["medication_id"]][:16]:
+                continue
+            docs.append({
+                "id": str(uuid4()),
+                "user_email": email,
+                "date": day_str,
+                "medication_id": slot["medication_id"],
+                "medication_name": slot["medication_name"],
+                "scheduled_time": scheduled,
+                "taken": False,
+                "taken_at": None,
+                "missed": True,
+                "source": "sweeper"
+            })
+    failures = await insert_tracker_events(database, docs)
+    await record_adherence(database, [doc for position, doc in enumerate(docs) if position not in failures])
+    return len(docs) - len(failures)
+
+async def _renew_sweep_lease(database, owner: str) -> bool:
+    return await _renew_lease(database.sweeper_checkpoints, MISSED_DOSE_CHECKPOINT_ID, owner, MISSED_DOSE_SWEEP_LEASE_SECONDS)
+
+async def run_missed_dose_sweep(database, now: Optional[datetime] = None) -> Optional[dict]:
+    # One pass over every user, MISSED_DOSE_SWEEP_CONCURRENCY batches at a time. The checkpoint records
+    # the last email of each finished group, so an interrupted pass resumes where it stopped.
+    owner = str(uuid4())
+    if not await _renew_sweep_lease(database, owner):
+        return None
+    now = now or datetime.now(timezone.utc)
+    checkpoint = await database.sweeper_checkpoints.find_one({"_id": MISSED_DOSE_CHECKPOINT_ID}) or {}
+    if checkpoint.get("last_email") is not None:
+        day, as_of = date.fromisoformat(checkpoint["day"]), datetime.fromisoformat(checkpoint["as_of"])
+    elif checkpoint.get("day") and checkpoint["day"] < now.date().isoformat() and not checkpoint.get("closed"):
+        # Keep sweeping the previous day until its last doses are past their grace period, so
+        # late-evening doses are swept after midnight but never early.
+        day = date.fromisoformat(checkpoint["day"])
+        as_of = min(now, datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(days=1, minutes=SCHEDULE_GRACE_MINUTES))
+    else:
+        day, as_of = now.date(), now
+    closed = as_of >= datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(days=1, minutes=SCHEDULE_GRACE_MINUTES)
+    last_email = checkpoint.get("last_email") or ""
+    stats = {"day": day.isoformat(), "users": 0, "missed": 0}
+    
+    while True:
+        users = await database.users.find(
+            {"email": {"$gt": last_email}}, {"_id": 0, "email": 1}
+        ).sort("email", ASCENDING).to_list(MISSED_DOSE_SWEEP_BATCH_USERS * MISSED_DOSE_SWEEP_CONCURRENCY)
+        if not users:
+            break
+        emails = [user["email"] for user in users]
+        missed = await asyncio.gather(*(
+            _sweep_missed_batch(database, emails[i:i + MISSED_DOSE_SWEEP_BATCH_USERS], day, as_of)
+            for i in range(0, len(emails), MISSED_DOSE_SWEEP_BATCH_USERS)
+        ))
+        last_email = emails[-1]
+        stats["users"] += len(emails)
+        stats["missed"] += sum(missed)
+        await database.sweeper_checkpoints.update_one(
+            {"_id": MISSED_DOSE_CHECKPOINT_ID},
+            {"$set": {"day": day.isoformat(), "as_of": as_of.isoformat(), "last_email": last_email}}
+        )
+        if not await _renew_sweep_lease(database, owner):
+            logger.warning("Lost the missed-dose sweep lease after %s", last_email)
+            return stats
+    await database.sweeper_checkpoints.update_one(
+        {"_id": MISSED_DOSE_CHECKPOINT_ID},
+        {"$set": {"day": day.isoformat(), "as_of": as_of.isoformat(), "last_email": None, "closed": closed, "lease_until": None}}
+    )
+    return stats
+
+async def missed_dose_sweeper():
+    while True:
+        try:
+            stats = await run_missed_dose_sweep(db)
+            if stats:
+                logger.info("Missed-dose sweep for %s: %d users, %d doses marked missed", stats["day"], stats["users"], stats["missed"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Missed-dose sweep failed: %s", e)
+        await asyncio.sleep(MISSED_DOSE_SWEEP_INTERVAL_SECONDS)
+
+TRACKER_WRITE_BEHIND = os.environ.get('TRACKER_WRITE_BEHIND', 'false').lower() == 'true'
+TRACKER_FLUSH_INTERVAL_SECONDS = float(os.environ.get('TRACKER_FLUSH_INTERVAL_SECONDS', '1.0'))
+TRACKER_FLUSH_MAX_PENDING = int(os.environ.get('TRACKER_FLUSH_MAX_PENDING', '1000'))
+
+class WriteBehindBuffer:
+    # Coalesces per-(collection, user, date) $set upserts in memory and flushes them in bulk.
+    def __init__(self, interval: float, max_pending: int):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.received = 0
+        self.written = 0
+        self._pending = {}
+        self._flushing = {}
+        self._flush_task = None
+        self._stopped = asyncio.Event()
+
+    def put(self, collection: str, email: str, day: str, fields: dict):
+        key = (collection, email, day)
+        self._pending[key] = {**self._pending.get(key, {}), **fields}
+        self.received += 1
+        if len(self._pending) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def get(self, collection: str, email: str, day: str) -> Optional[dict]:
+        key = (collection, email, day)
+        if key in self._pending or key in self._flushing:
+            return {**self._flushing.get(key, {}), **self._pending.get(key, {})}
+        return None
+
+    async def flush(self):
+        if not self._pending or self._flushing:
+            return
+        self._flushing, self._pending = self._pending, {}
+        by_collection = {}
+        for (collection, email, day), fields in self._flushing.items():
+            by_collection.setdefault(collection, []).append(UpdateOne(
+                {"user_email": email, "date": day},
+                {"$set": {**fields, "date": day, "user_email": email}},
+                upsert=True
+            ))
+        try:
+            for collection, ops in by_collection.items():
+                await db[collection].bulk_write(ops, ordered=False)
+                self.written += len(ops)
+        except Exception as e:
+            logger.error("Write-behind flush failed, keeping %d updates buffered: %s", len(self._flushing), e)
+            self._requeue()
+        except BaseException:
+            self._requeue()
+            raise
+        finally:
+            self._flushing = {}
+
+    def _requeue(self):
+        for key, fields in self._flushing.items():
+            self._pending[key] = {**fields, **self._pending.get(key, {})}
+
+    async def run(self):
+        # Stopped with stop() rather than cancelled, so a flush in progress always completes.
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def drain(self):
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+tracker_buffer = WriteBehindBuffer(TRACKER_FLUSH_INTERVAL_SECONDS, TRACKER_FLUSH_MAX_PENDING)
+
+async def upsert_day_fields(collection: str, email: str, day: str, fields: dict):
+    if TRACKER_WRITE_BEHIND:
+        tracker_buffer.put(collection, email, day, fields)
+        return
+    await db[collection].update_one(
+        {"user_email": email, "date": day},
+        {"$set": {**fields, "date": day, "user_email": email}},
+        upsert=True
+    )
 
 @api_router.post("/tracker/water")
 async def track_water(request: WaterIntakeRequest, current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).date().isoformat()
-    await db.water_intake.update_one(
-        {"user_email": current_user["email"], "date": today},
-        {"$set": {"glasses": request.glasses, "date": today, "user_email": current_user["email"]}},
-        upsert=True
-    )
+    await upsert_day_fields("water_intake", current_user["email"], today, {"glasses": request.glasses})
     return {"message": "Water intake tracked successfully"}
 
 @api_router.post("/tracker/lunch")
 async def track_lunch(request: LunchRequest, current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).date().isoformat()
     time = datetime.now(timezone.utc).isoformat() if request.eaten else None
-    await db.lunch_tracker.update_one(
-        {"user_email": current_user["email"], "date": today},
-        {"$set": {"eaten": request.eaten, "time": time, "date": today, "user_email": current_user["email"]}},
-        upsert=True
-    )
+    await upsert_day_fields("lunch_tracker", current_user["email"], today, {"eaten": request.eaten, "time": time})
     return {"message": "Lunch tracked successfully"}
 
 @api_router.post("/appointments", response_model=Appointment)
-async def create_appointment(appt: AppointmentCreate, current_user: dict = Depends(get_current_user)):
-    from uuid import uuid4
-    appt_doc = {
-        "id": str(uuid4()),
-        "user_email": current_user["email"],
-        "doctor_name": appt.doctor_name,
-        "date": appt.date,
-        "time": appt.time,
-        "reason": appt.reason,
-        "type": appt.type,
-        "status": "pending",
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.appointments.insert_one(appt_doc)
-    return Appointment(**appt_doc)
+async def create_appointment(appt: AppointmentCreate, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    async with IdempotentRequest(request, current_user, "create_appointment", appt) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        appt_doc = {
+            "id": str(uuid4()),
+            "user_email": current_user["email"],
+            "doctor_name": appt.doctor_name,
+            "date": appt.date,
+            "time": appt.time,
+            "reason": appt.reason,
+            "type": appt.type,
+            "status": "pending",
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        minute = _minute_of_day(appt.time)
+        doctor_day = await availability_index.get(appt.doctor_name, appt.date) if minute is not None else None
+        if doctor_day is not None:
+            if doctor_day.conflicts(minute):
+                raise HTTPException(status_code=409, detail="Doctor is not available at that time")
+            # Reserve before the insert await so a concurrent booking in this process sees the slot taken.
+            doctor_day.add(minute, appt_doc["id"])
+        try:
+            await db.appointments.insert_one(appt_doc)
+        except Exception:
+            if doctor_day is not None:
+                doctor_day.remove(appt_doc["id"])
+            raise
+        if minute is not None and not await availability_index.confirm(appt_doc, minute):
+            await db.appointments.delete_one({"id": appt_doc["id"]})
+            raise HTTPException(status_code=409, detail="Doctor is not available at that time")
+        reminder_index.appointment_saved(current_user["email"], appt_doc)
+        search_index.document_saved(current_user["email"], "appointment", appt_doc)
+        await bump_versions(current_user["email"], "appointments", changes=(("appointments", appt_doc["id"], "upsert"),))
+        idem.result = {field: appt_doc.get(field) for field in Appointment.model_fields}
+        return model_response(Appointment, appt_doc, response)
 
 @api_router.get("/appointments", response_model=List[Appointment])
-async def get_appointments(current_user: dict = Depends(get_current_user)):
-    appts = await db.appointments.find({"user_email": current_user["email"]}, {"_id": 0}).to_list(1000)
-    return [Appointment(**appt) for appt in appts]
+async def get_appointments(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if not stream:
+        not_modified = check_not_modified(request, response, await current_versions(current_user["email"]), "appointments")
+        if not_modified:
+            return not_modified
+    return await list_documents(db.appointments, {"user_email": current_user["email"]}, Appointment, response, limit, after, stream)
 
-@api_router.post("/messages", response_model=Message)
-async def send_message(msg: MessageCreate, current_user: dict = Depends(get_current_user)):
-    from uuid import uuid4
-    msg_doc = {
-        "id": str(uuid4()),
-        "user_email": current_user["email"],
-        "doctor_name": msg.doctor_name,
-        "message": msg.message,
-        "reply": None,
-        "created_at": datetime.now(timezone.utc).isoformat()
+@api_router.get("/doctors/{doctor_name}/availability")
+async def get_doctor_availability(
+    doctor_name: str,
+    date: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    current_user: dict = Depends(get_current_user)
+):
+    opens, closes = _minute_of_day(CLINIC_OPEN), _minute_of_day(CLINIC_CLOSE)
+    doctor_day = await availability_index.get(doctor_name, date)
+    return {
+        "doctor_name": doctor_name,
+        "date": date,
+        "slot_minutes": APPOINTMENT_SLOT_MINUTES,
+        "available": doctor_day.open_slots(opens, closes)
     }
-    await db.messages.insert_one(msg_doc)
-    return Message(**msg_doc)
+
+@api_router.post("/messages", response_model=Message)
+async def send_message(msg: MessageCreate, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    async with IdempotentRequest(request, current_user, "send_message", msg) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        msg_doc = {
+            "id": str(uuid4()),
+            "user_email": current_user["email"],
+            "doctor_name": msg.doctor_name,
+            "message": msg.message,
+            "reply": None,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        await db.messages.insert_one(msg_doc)
+        search_index.document_saved(current_user["email"], "message", msg_doc)
+        await bump_versions(current_user["email"], changes=(("messages", msg_doc["id"], "upsert"),))
+        idem.result = {field: msg_doc.get(field) for field in Message.model_fields}
+        return model_response(Message, msg_doc, response)
 
 @api_router.get("/messages", response_model=List[Message])
-async def get_messages(current_user: dict = Depends(get_current_user)):
-    msgs = await db.messages.find({"user_email": current_user["email"]}, {"_id": 0}).to_list(1000)
-    return [Message(**msg) for msg in msgs]
+async def get_messages(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    return await list_documents(db.messages, {"user_email": current_user["email"]}, Message, response, limit, after, stream)
+
+@api_router.get("/search")
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        offset = int(after) if after else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = limit or DEFAULT_PAGE_SIZE
+    index = await search_index.get(current_user["email"])
+    hits = index.search(q)
+    if len(hits) > offset + limit:
+        response.headers["X-Next-Cursor"] = str(offset + limit)
+    return [
+        {"kind": kind, "score": round(score, 4), **index.documents[(kind, doc_id)][0]}
+        for score, (kind, doc_id) in hits[offset:offset + limit]
+    ]
+
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', '1000'))
+# A pending sequence older than this belongs to a writer that died before logging it.
+SYNC_PENDING_TIMEOUT_SECONDS = float(os.environ.get('SYNC_PENDING_TIMEOUT_SECONDS', '30'))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+SYNC_GZIP_MIN_BYTES = 1024
+SYNC_COLLECTIONS = {"medications": Medication, "appointments": Appointment, "messages": Message}
+
+async def compact_change_log(database, retention_days: int = SYNC_TOMBSTONE_RETENTION_DAYS) -> int:
+    # Upserts already keep one entry per document; this drops old delete tombstones and raises each
+    # user's sync_floor so clients that last synced before them get a full reset instead of a gap.
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    expired = {"op": "delete", "at": {"$lt": cutoff}}
+    floors = await database.change_log.aggregate([
+        {"$match": expired},
+        {"$group": {"_id": "$user_email", "seq": {"$max": "$seq"}}}
+    ]).to_list(None)
+    if not floors:
+        return 0
+    await database.users.bulk_write([
+        UpdateOne({"email": floor["_id"]}, {"$max": {"sync_floor": floor["seq"]}}) for floor in floors
+    ], ordered=False)
+    result = await database.change_log.delete_many(expired)
+    return result.deleted_count
+
+def settled_sync_seq(user: dict) -> int:
+    # Highest sequence below which every change_log entry has been written.
+    cutoff = time.time() - SYNC_PENDING_TIMEOUT_SECONDS
+    pending = [entry["seq"] for entry in (user.get("sync_pending") or {}).values() if entry.get("at", 0) >= cutoff]
+    return min(pending) - 1 if pending else user.get("sync_seq", 0)
+
+def gzip_json(request: Request, content) -> Response:
+    body = orjson.dumps(content)
+    if len(body) < SYNC_GZIP_MIN_BYTES or "gzip" not in request.headers.get("accept-encoding", ""):
+        return Response(body, media_type="application/json")
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return Response(
+        compressor.compress(body) + compressor.flush(),
+        media_type="application/json",
+        headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+    )
+
+@api_router.get("/sync")
+async def sync(request: Request, since: int = Query(0, ge=0), current_user: dict = Depends(get_current_user)):
+    email = current_user["email"]
+    user = await db.users.find_one({"email": email}, {"_id": 0, "sync_seq": 1, "sync_floor": 1, "sync_pending": 1}) or {}
+    reset = 0 < since < user.get("sync_floor", 0)
+    if since == 0 or reset:
+        # Full snapshot; sync_seq was read first, so anything written meanwhile is picked up next time.
+        collections = list(SYNC_COLLECTIONS)
+        results = await asyncio.gather(
+            *(db[collection].find({"user_email": email}, model_projection(model) | {"_id": 0}).to_list(None)
+              for collection, model in SYNC_COLLECTIONS.items()),
+            db.users.find_one({"email": email}, model_projection(UserProfile) | {"_id": 0})
+        )
+        return gzip_json(request, {
+            "seq": user.get("sync_seq", 0),
+            "has_more": False,
+            "reset": True,
+            "changes": dict(zip(collections, results)),
+            "deleted": {},
+            "profile": results[-1]
+        })
+    
+    # Sequences are allocated before their log entries are written; stop below the oldest one still
+    # being logged so a client never skips past an entry that lands later.
+    settled = settled_sync_seq(user)
+    cutoff = time.time() - SYNC_PENDING_TIMEOUT_SECONDS
+    stale = [token for token, entry in (user.get("sync_pending") or {}).items() if entry.get("at", 0) < cutoff]
+    if stale:
+        await db.users.update_one({"email": email}, {"$unset": {f"sync_pending.{token}": "" for token in stale}})
+    entries = await db.change_log.find(
+        {"user_email": email, "seq": {"$gt": since, "$lte": settled}},
+        {"_id": 0, "collection": 1, "doc_id": 1, "op": 1, "seq": 1}
+    ).sort("seq", ASCENDING).to_list(SYNC_MAX_CHANGES + 1)
+    has_more = len(entries) > SYNC_MAX_CHANGES
+    entries = entries[:SYNC_MAX_CHANGES]
+    upserts, deleted = {}, {}
+    for entry in entries:
+        target = deleted if entry["op"] == "delete" else upserts
+        target.setdefault(entry["collection"], []).append(entry["doc_id"])
+    
+    collections = [collection for collection in upserts if collection in SYNC_COLLECTIONS]
+    results = await asyncio.gather(
+        *(db[collection].find({"user_email": email, "id": {"$in": upserts[collection]}},
+                              model_projection(SYNC_COLLECTIONS[collection]) | {"_id": 0}).to_list(None)
+          for collection in collections),
+        *([db.users.find_one({"email": email}, model_projection(UserProfile) | {"_id": 0})] if "users" in upserts else [])
+    )
+    content = {
+        "seq": entries[-1]["seq"] if has_more else max(since, settled),
+        "has_more": has_more,
+        "reset": False,
+        "changes": dict(zip(collections, results)),
+        "deleted": deleted
+    }
+    if "users" in upserts:
+        content["profile"] = results[-1]
+    return gzip_json(request, content)
+
+MAX_DASHBOARD_PATIENTS = int(os.environ.get('MAX_DASHBOARD_PATIENTS', '1000'))
+
+class CaregiverLink(BaseModel):
+    email: EmailStr
+
+@api_router.post("/caregivers")
+async def add_caregiver(link: CaregiverLink, current_user: dict = Depends(get_current_user)):
+    if link.email == current_user["email"]:
+        raise HTTPException(status_code=400, detail="You cannot add yourself as a caregiver")
+    await db.users.update_one({"email": current_user["email"]}, {"$addToSet": {"caregivers": link.email}})
+    user_cache.invalidate(current_user["email"])
+    return {"message": "Caregiver added successfully"}
+
+@api_router.delete("/caregivers/{email}")
+async def remove_caregiver(email: str, current_user: dict = Depends(get_current_user)):
+    result = await db.users.update_one({"email": current_user["email"], "caregivers": email}, {"$pull": {"caregivers": email}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Caregiver not found")
+    user_cache.invalidate(current_user["email"])
+    return {"message": "Caregiver removed successfully"}
+
+@api_router.get("/patients")
+async def get_patients(current_user: dict = Depends(get_current_user)):
+    return await db.users.find(
+        {"caregivers": current_user["email"]}, {"_id": 0, "name": 1, "email": 1}
+    ).sort("email", ASCENDING).to_list(MAX_DASHBOARD_PATIENTS)
+
+class UserGroups:
+    # Reads a cursor sorted by user_email one user's documents at a time, for merge-joining several sources.
+    def __init__(self, cursor):
+        self._cursor = cursor.__aiter__()
+        self._head = None
+        self._done = False
+
+    async def _next(self):
+        try:
+            self._head = await self._cursor.__anext__()
+        except StopAsyncIteration:
+            self._head, self._done = None, True
+
+    async def take(self, email: str) -> List[dict]:
+        if self._head is None and not self._done:
+            await self._next()
+        while self._head is not None and self._head["user_email"] < email:
+            await self._next()
+        docs = []
+        while self._head is not None and self._head["user_email"] == email:
+            docs.append(self._head)
+            await self._next()
+        for doc in docs:
+            doc.pop("user_email", None)
+        return docs
+
+async def dashboard_lines(patients: List[dict], today: str):
+    emails = [patient["email"] for patient in patients]
+    by_user = {"user_email": {"$in": emails}}
+    by_user_today = {**by_user, "date": today}
+    source, pipeline = tracker_events_for_users(db, emails, today)
+    # One sorted query per source for the whole panel, merge-joined per patient as the cursors advance.
+    medications = UserGroups(db.medications.find(by_user, {"_id": 0}).sort([("user_email", ASCENDING), ("id", ASCENDING)]))
+    trackers = UserGroups(source.aggregate(pipeline))
+    water = UserGroups(db.water_intake.find(by_user_today, {"_id": 0, "user_email": 1, "glasses": 1}).sort("user_email", ASCENDING))
+    lunch = UserGroups(db.lunch_tracker.find(by_user_today, {"_id": 0, "user_email": 1, "eaten": 1}).sort("user_email", ASCENDING))
+    appointments = UserGroups(db.appointments.find({**by_user, "status": "pending"}, {"_id": 0}).sort([("user_email", ASCENDING), ("_id", ASCENDING)]))
+    for patient in patients:
+        email = patient["email"]
+        water_docs, lunch_docs = await water.take(email), await lunch.take(email)
+        water_doc = water_docs[0] if water_docs else None
+        lunch_doc = lunch_docs[0] if lunch_docs else None
+        if TRACKER_WRITE_BEHIND:
+            water_doc = tracker_buffer.get("water_intake", email, today) or water_doc
+            lunch_doc = tracker_buffer.get("lunch_tracker", email, today) or lunch_doc
+        yield orjson.dumps({
+            **patient,
+            "medications": await medications.take(email),
+            "tracker": await trackers.take(email),
+            "water": (water_doc or {}).get("glasses", 0),
+            "lunch": (lunch_doc or {}).get("eaten", False),
+            "appointments": await appointments.take(email)
+        }) + b"\n"
+
+@api_router.get("/patients/dashboard")
+async def get_patients_dashboard(patients: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    query = {"caregivers": current_user["email"]}
+    if patients:
+        query["email"] = {"$in": patients.split(",")[:MAX_DASHBOARD_PATIENTS]}
+    linked = await db.users.find(
+        query, {"_id": 0, "name": 1, "email": 1, "age": 1, "phone": 1, "diseases": 1}
+    ).sort("email", ASCENDING).to_list(MAX_DASHBOARD_PATIENTS)
+    today = datetime.now(timezone.utc).date().isoformat()
+    return StreamingResponse(dashboard_lines(linked, today), media_type="application/x-ndjson")
 
 @api_router.get("/reminders")
-async def get_reminders(current_user: dict = Depends(get_current_user)):
-    meds = await db.medications.find({"user_email": current_user["email"]}, {"_id": 0}).to_list(1000)
-    appts = await db.appointments.find(
-        {"user_email": current_user["email"], "status": "pending"},
-        {"_id": 0}
-    ).to_list(1000)
+async def get_reminders(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    medications_after: Optional[str] = None,
+    appointments_after: Optional[str] = None,
+    stream: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    med_query = {"user_email": current_user["email"]}
+    appt_query = {"user_email": current_user["email"], "status": "pending"}
+    if stream:
+        async def reminder_lines():
+            async for line in stream_ndjson(db.medications, med_query, limit, medications_after, kind="medication"):
+                yield line
+            async for line in stream_ndjson(db.appointments, appt_query, limit, appointments_after, kind="appointment"):
+                yield line
+        return StreamingResponse(reminder_lines(), media_type="application/x-ndjson")
+    not_modified = check_not_modified(request, response, await current_versions(current_user["email"]), "medications", "appointments")
+    if not_modified:
+        return not_modified
+
+    (meds, meds_cursor), (appts, appts_cursor) = await asyncio.gather(
+        fetch_page(db.medications, med_query, limit or DEFAULT_PAGE_SIZE, medications_after),
+        fetch_page(db.appointments, appt_query, limit or DEFAULT_PAGE_SIZE, appointments_after)
+    )
+    if meds_cursor:
+        response.headers["X-Next-Medications-Cursor"] = meds_cursor
+    if appts_cursor:
+        response.headers["X-Next-Appointments-Cursor"] = appts_cursor
     
-    return {
+    reminders = {
         "medications": meds,
         "appointments": appts
     }
+    if FAST_RESPONSES:
+        return fast_json(response, reminders)
+    return reminders
+
+@api_router.get("/events")
+async def stream_events(request: Request, token: Optional[str] = None):
+    # EventSource cannot set headers, so the token may also come as a query parameter.
+    auth_header = request.headers.get("authorization", "")
+    if auth_header.lower().startswith("bearer "):
+        token = auth_header[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    current_user = await authenticate_token(token)
+    email = current_user["email"]
+    subscriber = event_hub.subscribe(email)
+    
+    async def event_stream():
+        try:
+            yield _sse("ready", {"heartbeat": EVENT_HEARTBEAT_SECONDS})
+            while not subscriber.overflowed:
+                try:
+                    event, data = await asyncio.wait_for(subscriber.queue.get(), EVENT_HEARTBEAT_SECONDS)
+                    yield _sse(event, data)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": heartbeat\n\n"
+            if subscriber.overflowed:
+                yield _sse("resync", {})
+        finally:
+            event_hub.unsubscribe(email, subscriber)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+EXPORT_COLLECTIONS = {
+    "medications": Medication,
+    "appointments": Appointment,
+    "daily_tracker": DailyTracker,
+    "water_intake": WaterIntake,
+    "lunch_tracker": LunchTracker,
+}
+EXPORT_CSV_FIELDS = ["collection"] + list(dict.fromkeys(
+    field for model in EXPORT_COLLECTIONS.values() for field in model.model_fields if field != "user_email"
+))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def _csv_row(collection: str, doc: dict) -> str:
+    buffer = io.StringIO()
+    row = {"collection": collection}
+    for field, value in doc.items():
+        if field in EXPORT_CSV_FIELDS:
+            row[field] = ";".join(value) if isinstance(value, list) else value
+    csv.DictWriter(buffer, EXPORT_CSV_FIELDS, extrasaction="ignore").writerow(row)
+    return buffer.getvalue()
+
+async def export_chunks(email: str, collections: List[str], export_format: str):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = []
+    pending_size = 0
+    if export_format == "csv":
+        header = io.StringIO()
+        csv.writer(header).writerow(EXPORT_CSV_FIELDS)
+        pending.append(header.getvalue().encode())
+    for collection in collections:
+        if collection == "daily_tracker":
+            docs = iter_tracker_events(db, email, EXPORT_BATCH_SIZE)
+        else:
+            docs = db[collection].find({"user_email": email}, {"_id": 0}).sort("_id", ASCENDING).batch_size(EXPORT_BATCH_SIZE)
+        async for doc in docs:
+            doc.pop("user_email", None)
+            if export_format == "csv":
+                line = _csv_row(collection, doc).encode()
+            else:
+                line = orjson.dumps({"collection": collection, **doc}) + b"\n"
+            pending.append(line)
+            pending_size += len(line)
+            if pending_size >= EXPORT_CHUNK_BYTES:
+                chunk = compressor.compress(b"".join(pending))
+                pending, pending_size = [], 0
+                if chunk:
+                    yield chunk
+    yield compressor.compress(b"".join(pending)) + compressor.flush()
+
+@api_router.get("/export")
+async def export_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    collections: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    selected = collections.split(",") if collections else list(EXPORT_COLLECTIONS)
+    unknown = [name for name in selected if name not in EXPORT_COLLECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown collections: {', '.join(unknown)}")
+    filename = f"medbuddy-export-{datetime.now(timezone.utc).date().isoformat()}.{format}.gz"
+    return StreamingResponse(
+        export_chunks(current_user["email"], selected, format),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/reminders/next")
+async def get_next_reminders(
+    window: int = Query(60, ge=1, le=MAX_REMINDER_WINDOW_MINUTES),
+    current_user: dict = Depends(get_current_user)
+):
+    schedule = await reminder_index.get(current_user["email"])
+    now = datetime.now(timezone.utc)
+    return {
+        "now": now.isoformat(),
+        "window": window,
+        "reminders": schedule.upcoming(now, window)
+    }
+
+@app.get("/health/ready", include_in_schema=False)
+async def health_ready():
+    status = {
+        "ready": getattr(app.state, "ready", False),
+        "pool": {
+            "open_connections": pool_monitor.open_connections,
+            "checked_out": pool_monitor.checked_out,
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "utilization": round(pool_monitor.checked_out / MONGO_MAX_POOL_SIZE, 4) if MONGO_MAX_POOL_SIZE else None
+        }
+    }
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    lines = []
+    for histogram in (request_latency, mongo_command_latency, mongo_checkout_wait):
+        lines.extend(histogram.render())
+    cache = user_cache.stats()
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled.",
+        "# TYPE http_requests_in_flight gauge", f"http_requests_in_flight {metrics_state['in_flight']}",
+        "# TYPE user_cache_hits_total counter", f"user_cache_hits_total {cache['hits']}",
+        "# TYPE user_cache_misses_total counter", f"user_cache_misses_total {cache['misses']}",
+        "# TYPE user_cache_evictions_total counter", f"user_cache_evictions_total {cache['evictions']}",
+        "# TYPE user_cache_size gauge", f"user_cache_size {cache['size']}",
+        "# TYPE password_hash_pending gauge", f"password_hash_pending {password_hasher.pending}",
+        "# TYPE password_hash_rejected_total counter", f"password_hash_rejected_total {password_hasher.rejected}",
+        "# TYPE event_stream_connections gauge", f"event_stream_connections {event_hub.connection_count()}",
+        "# TYPE event_stream_dropped_total counter", f"event_stream_dropped_total {event_hub.dropped}",
+        "# TYPE rate_limited_total counter", f"rate_limited_total {rate_limiter.limited}",
+        "# TYPE load_shed_total counter", f"load_shed_total {admission_state['shed']}",
+        "# TYPE mongodb_pool_open_connections gauge", f"mongodb_pool_open_connections {pool_monitor.open_connections}",
+        "# TYPE mongodb_pool_checked_out gauge", f"mongodb_pool_checked_out {pool_monitor.checked_out}",
+    ]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+class MetricsMiddleware:
+    # Plain ASGI middleware so timing covers the full response, including streamed bodies.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in ("/metrics", "/health/ready"):
+            await self.app(scope, receive, send)
+            return
+        status = {"code": 500}
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+        
+        start = time.perf_counter()
+        metrics_state["in_flight"] += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics_state["in_flight"] -= 1
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            request_latency.observe((scope["method"], route_path, str(status["code"])), time.perf_counter() - start)
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', '512'))
+
+def _rate_budget(value: str):
+    rate, burst = value.split("/")
+    return float(rate), float(burst)
+
+# (requests per second, burst) per route; anything not listed uses the default budget.
+RATE_LIMIT_BUDGETS = {
+    ("POST", "/api/auth/login"): _rate_budget(os.environ.get('RATE_LIMIT_LOGIN', '0.2/5')),
+    ("POST", "/api/auth/register"): _rate_budget(os.environ.get('RATE_LIMIT_REGISTER', '0.05/3')),
+    ("GET", "/api/tracker/today"): _rate_budget(os.environ.get('RATE_LIMIT_DASHBOARD', '1/10')),
+    ("GET", "/api/export"): _rate_budget(os.environ.get('RATE_LIMIT_EXPORT', '0.01/2')),
+}
+RATE_LIMIT_DEFAULT = _rate_budget(os.environ.get('RATE_LIMIT_DEFAULT', '5/30'))
+RATE_LIMIT_EXEMPT_PATHS = {"/metrics", "/health/ready"}
+# Anonymous auth routes are limited per submitted email, so users sharing a proxy or clinic NAT don't share a bucket.
+RATE_LIMIT_EMAIL_KEYED = {("POST", "/api/auth/login"), ("POST", "/api/auth/register")}
+RATE_LIMIT_MAX_BODY_BYTES = 16 * 1024
+# Number of reverse proxies in front of the app whose X-Forwarded-For entries can be trusted.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+
+class TokenBucketLimiter:
+    # Token buckets keyed by (subject, route budget) in a bounded LRU; an evicted client simply starts full again.
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.limited = 0
+        self._buckets = OrderedDict()
+
+    def acquire(self, key: tuple, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+        else:
+            self._buckets.move_to_end(key)
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        self.limited += 1
+        return (1 - bucket[0]) / rate if rate > 0 else 60.0
+
+rate_limiter = TokenBucketLimiter(RATE_LIMIT_MAX_KEYS)
+admission_state = {"in_flight": 0, "shed": 0}
+
+def _rate_limit_subject(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization" and value[:7].lower() == b"bearer ":
+            try:
+                subject = jwt.decode(value[7:].decode(), SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except jwt.PyJWTError:
+                break
+            if subject:
+                return f"user:{subject}"
+            break
+    return f"ip:{_client_ip(scope)}"
+
+def _client_ip(scope) -> str:
+    if TRUSTED_PROXY_HOPS:
+        forwarded = [value for name, value in scope.get("headers", []) if name == b"x-forwarded-for"]
+        hops = [hop.strip() for hop in b",".join(forwarded).decode("latin-1").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    client_addr = scope.get("client")
+    return client_addr[0] if client_addr else "unknown"
+
+async def _buffer_body(receive):
+    messages = []
+    size = 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        size += len(message.get("body", b""))
+        if message["type"] != "http.request" or not message.get("more_body") or size > RATE_LIMIT_MAX_BODY_BYTES:
+            break
+    body = b"".join(message.get("body", b"") for message in messages)
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+    return body, replay
+
+def _submitted_email(body: bytes) -> Optional[str]:
+    try:
+        email = orjson.loads(body).get("email")
+    except (orjson.JSONDecodeError, AttributeError):
+        return None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+class AdmissionControlMiddleware:
+    # Rejects over-budget clients and sheds load above the concurrency cap before any handler or Mongo work.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in RATE_LIMIT_EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        if admission_state["in_flight"] >= MAX_CONCURRENT_REQUESTS:
+            admission_state["shed"] += 1
+            await ORJSONResponse({"detail": "Server busy, please retry"}, status_code=503, headers={"Retry-After": "1"})(scope, receive, send)
+            return
+        route_key = (scope["method"], scope["path"])
+        rate, burst = RATE_LIMIT_BUDGETS.get(route_key, RATE_LIMIT_DEFAULT)
+        budget = route_key if route_key in RATE_LIMIT_BUDGETS else "default"
+        subject = None
+        if route_key in RATE_LIMIT_EMAIL_KEYED:
+            body, receive = await _buffer_body(receive)
+            email = _submitted_email(body)
+            subject = f"email:{email}" if email else None
+        retry_after = rate_limiter.acquire((subject or _rate_limit_subject(scope), budget), rate, burst)
+        if retry_after:
+            await ORJSONResponse(
+                {"detail": "Rate limit exceeded"},
+                status_code=429,
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )(scope, receive, send)
+            return
+        # The slot is released once the response starts, so long-lived SSE and export streams
+        # don't count against MAX_CONCURRENT_REQUESTS for as long as they stay connected.
+        admission_state["in_flight"] += 1
+        holding = True
+
+        def release():
+            nonlocal holding
+            if holding:
+                holding = False
+                admission_state["in_flight"] -= 1
+
+        async def send_and_release(message):
+            if message["type"] == "http.response.start":
+                release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            release()
 
 app.include_router(api_router)
 
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Idempotent-Replayed", "X-Next-Cursor", "X-Next-Medications-Cursor", "X-Next-Appointments-Cursor"],
 )
 
 logging.basicConfig(
@@ -373,7 +2934,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
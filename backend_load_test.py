@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).parent
+
+# Relative weight of each action in a virtual user's loop, roughly matching production traffic.
+DEFAULT_MIX = {
+    "dashboard": 40,
+    "reminders": 15,
+    "track_medication": 12,
+    "track_water": 12,
+    "track_lunch": 3,
+    "medications": 10,
+    "login": 5,
+    "profile": 3,
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class MedBuddyLoadTester:
+    def __init__(self, client, users=20, duration=30.0, mix=None, seed=None):
+        self.client = client
+        self.users = users
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.random = random.Random(seed)
+        self.run_id = datetime.now().strftime('%Y%m%d%H%M%S')
+        self.latencies = {}
+        self.errors = {}
+        self.elapsed = 0.0
+
+    async def request(self, route, method, endpoint, token=None, data=None, expected_status=200):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, f"/api{endpoint}", json=data, headers=headers)
+            ok = response.status_code == expected_status
+        except httpx.HTTPError:
+            response = None
+            ok = False
+        self.latencies.setdefault(route, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return None
+        return response.json()
+
+    async def setup_user(self, index):
+        user = {
+            "name": f"Load User {index}",
+            "email": f"load{self.run_id}-{index}@example.com",
+            "password": "LoadTest123!",
+        }
+        result = await self.request("register", "POST", "/auth/register", data=user)
+        if result is None:
+            return None
+        user["token"] = result["token"]
+        user["medication_ids"] = []
+        for name, times in (("Metformin", ["08:00", "20:00"]), ("Lisinopril", ["09:00"])):
+            med = await self.request("create_medication", "POST", "/medications", user["token"], {
+                "name": name,
+                "dosage": "10mg",
+                "frequency": "Daily",
+                "times": times,
+            })
+            if med:
+                user["medication_ids"].append(med["id"])
+        return user
+
+    async def run_action(self, action, user):
+        token = user["token"]
+        if action == "dashboard":
+            await self.request(action, "GET", "/tracker/today", token)
+        elif action == "reminders":
+            await self.request(action, "GET", "/reminders", token)
+        elif action == "medications":
+            await self.request(action, "GET", "/medications", token)
+        elif action == "profile":
+            await self.request(action, "GET", "/profile", token)
+        elif action == "track_medication" and user["medication_ids"]:
+            await self.request(action, "POST", "/tracker/medication", token, {
+                "medication_id": self.random.choice(user["medication_ids"]),
+                "taken": True,
+                "taken_at": datetime.now().isoformat(),
+                "missed": False,
+            })
+        elif action == "track_water":
+            await self.request(action, "POST", "/tracker/water", token, {"glasses": self.random.randint(1, 8)})
+        elif action == "track_lunch":
+            await self.request(action, "POST", "/tracker/lunch", token, {"eaten": True})
+        elif action == "login":
+            result = await self.request(action, "POST", "/auth/login", data={"email": user["email"], "password": user["password"]})
+            if result:
+                user["token"] = result["token"]
+
+    async def virtual_user(self, user, deadline):
+        actions = list(self.mix)
+        weights = [self.mix[action] for action in actions]
+        while time.perf_counter() < deadline:
+            await self.run_action(self.random.choices(actions, weights)[0], user)
+
+    async def run(self):
+        print(f"👥 Registering {self.users} virtual users...")
+        users = [user for user in await asyncio.gather(*(self.setup_user(i) for i in range(self.users))) if user]
+        if not users:
+            print("❌ No users could be registered, stopping load test")
+            return False
+        # Setup traffic is reported separately from the measured mix.
+        setup = {route: self.latencies.pop(route) for route in ("register", "create_medication") if route in self.latencies}
+
+        print(f"🚀 Running mixed workload for {self.duration:.0f}s...")
+        start = time.perf_counter()
+        await asyncio.gather(*(self.virtual_user(user, start + self.duration) for user in users))
+        self.elapsed = time.perf_counter() - start
+        self.setup_latencies = setup
+        return True
+
+    def route_stats(self, latencies):
+        stats = {}
+        for route, values in sorted(latencies.items()):
+            values = sorted(values)
+            stats[route] = {
+                "requests": len(values),
+                "errors": self.errors.get(route, 0),
+                "throughput_rps": round(len(values) / self.elapsed, 2) if self.elapsed else None,
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        return stats
+
+    def report(self):
+        routes = self.route_stats(self.latencies)
+        total = sum(route["requests"] for route in routes.values())
+        errors = sum(route["errors"] for route in routes.values())
+        print("=" * 78)
+        print(f"{'route':<18}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for route, stats in routes.items():
+            print(f"{route:<18}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>10}"
+                  f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+        print("=" * 78)
+        print(f"📊 {total} requests in {self.elapsed:.1f}s ({total / self.elapsed:.1f} req/s), {errors} errors")
+        return {
+            "summary": {
+                "users": self.users,
+                "duration_s": round(self.elapsed, 2),
+                "total_requests": total,
+                "total_errors": errors,
+                "throughput_rps": round(total / self.elapsed, 2) if self.elapsed else None,
+            },
+            "routes": routes,
+            "setup_routes": self.route_stats(self.setup_latencies),
+        }
+
+
+async def run_load_test(args):
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+        lifespan = None
+        target = args.base_url
+    else:
+        sys.path.insert(0, str(ROOT_DIR / "backend"))
+        # Per-user rate limits would turn the measured mix into 429s; keep them off unless asked for.
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        import server
+        if args.mock_db:
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                print("❌ --mock-db needs the mongomock-motor package")
+                return None
+            mock_client = AsyncMongoMockClient()
+            server.create_mongo_client = lambda: mock_client
+        lifespan = server.app.router.lifespan_context(server.app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest", timeout=30)
+        target = "in-process app" + (" (in-memory Mongo)" if args.mock_db else "")
+
+    print("🧪 Starting MedBuddy load test...")
+    print(f"🌐 Target: {target}")
+    try:
+        tester = MedBuddyLoadTester(client, users=args.users, duration=args.duration, seed=args.seed)
+        if not await tester.run():
+            return None
+        results = tester.report()
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    results["config"] = {
+        "target": target,
+        "users": args.users,
+        "duration_s": args.duration,
+        "seed": args.seed,
+        "mix": DEFAULT_MIX,
+        "started_at": datetime.now().isoformat(),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async load test for the MedBuddy API")
+    parser.add_argument("--base-url", help="Hit a running server instead of the in-process app")
+    parser.add_argument("--mock-db", action="store_true", help="Run the in-process app on an in-memory Mongo stand-in")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured run time in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the request mix")
+    parser.add_argument("--output", default=str(ROOT_DIR / "backend_load_test_results.json"), help="Where to save JSON results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load_test(args))
+    if results is None:
+        return 1
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+    return 0 if results["summary"]["total_errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -177,6 +177,24 @@ class MedBuddyAPITester:
         self.log_test("Track Medication", success, result if not success else "")
         return success
 
+    def test_track_medication_batch(self):
+        """Test batch medication tracking"""
+        if not hasattr(self, 'medication_id'):
+            self.log_test("Track Medication Batch", False, "No medication ID available")
+            return False
+            
+        batch_data = [
+            {"medication_id": self.medication_id, "taken": True, "taken_at": datetime.now().isoformat(), "missed": False},
+            {"medication_id": str(uuid4()), "taken": True, "missed": False}
+        ]
+        success, result = self.make_request('POST', '/tracker/medication/batch', batch_data, 200)
+        if success and result.get('tracked') == 1 and result.get('failed') == 1:
+            self.log_test("Track Medication Batch", True)
+            return True
+        else:
+            self.log_test("Track Medication Batch", False, result)
+            return False
+
     def test_get_today_tracker(self):
         """Test get today's tracker"""
         success, result = self.make_request('GET', '/tracker/today', expected_status=200)
@@ -299,6 +317,7 @@ class MedBuddyAPITester:
             self.test_get_medications()
             self.test_update_medication()
             self.test_track_medication()
+            self.test_track_medication_batch()
             self.test_delete_medication()
 
         # Tracker tests
@@ -0,0 +1,27 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    # In-memory stand-in for the app database, for tests of code that talks to Mongo.
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import server
+
+    database = mongomock_motor.AsyncMongoMockClient()["test_database"]
+    monkeypatch.setattr(server, "db", database)
+    return database
@@ -0,0 +1,75 @@
+from datetime import date
+
+import pytest
+
+import server
+from server import _bucket_span, _cover_range, record_adherence
+
+
+def test_single_day():
+    assert _cover_range(date(2026, 3, 5), date(2026, 3, 5)) == ([], ["2026-03-05"])
+
+
+def test_whole_month_uses_month_bucket():
+    assert _cover_range(date(2026, 2, 1), date(2026, 2, 28)) == (["2026-02"], [])
+
+
+def test_partial_month_uses_day_buckets():
+    months, days = _cover_range(date(2026, 2, 1), date(2026, 2, 27))
+    assert months == []
+    assert len(days) == 27
+
+
+def test_ragged_edges_around_whole_months():
+    months, days = _cover_range(date(2026, 1, 30), date(2026, 4, 2))
+    assert months == ["2026-02", "2026-03"]
+    assert days == ["2026-01-30", "2026-01-31", "2026-04-01", "2026-04-02"]
+
+
+def test_leap_year_and_year_boundary():
+    assert _cover_range(date(2024, 2, 1), date(2024, 2, 29)) == (["2024-02"], [])
+    assert _cover_range(date(2025, 12, 1), date(2026, 1, 31)) == (["2025-12", "2026-01"], [])
+
+
+def test_empty_when_end_before_start():
+    assert _cover_range(date(2026, 3, 2), date(2026, 3, 1)) == ([], [])
+
+
+def test_bucket_span():
+    assert _bucket_span("day", date(2026, 3, 4)) == (date(2026, 3, 4), date(2026, 3, 4))
+    assert _bucket_span("week", date(2026, 3, 4)) == (date(2026, 3, 2), date(2026, 3, 8))
+    assert _bucket_span("week", date(2026, 3, 8)) == (date(2026, 3, 2), date(2026, 3, 8))
+    assert _bucket_span("month", date(2024, 2, 10)) == (date(2024, 2, 1), date(2024, 2, 29))
+
+
+def dose(day, taken=True, med="m1"):
+    return {"user_email": "adh@example.com", "medication_id": med, "medication_name": med.upper(),
+            "date": day, "taken": taken, "missed": not taken}
+
+
+async def adherence(start, end, granularity):
+    return await server.get_adherence(start=start, end=end, granularity=granularity, medication_id=None,
+                                      current_user={"email": "adh@example.com"})
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("granularity", ["day", "week", "month"])
+async def test_series_adds_up_to_range_totals(mongo, granularity):
+    days = ["2026-02-27", "2026-03-01", "2026-03-03", "2026-03-04", "2026-03-10", "2026-03-31", "2026-04-02"]
+    await record_adherence(mongo, [dose(day) for day in days] + [dose("2026-03-04", taken=False, med="m2")])
+    result = await adherence("2026-03-03", "2026-03-31", granularity)
+    assert (result["taken"], result["missed"]) == (4, 1)
+    assert sum(entry["taken"] for entry in result["series"]) == 4
+    assert sum(entry["missed"] for entry in result["series"]) == 1
+    assert sum(entry["events"] for entry in result["series"]) == 5
+
+
+@pytest.mark.anyio
+async def test_week_series_clips_edge_weeks(mongo):
+    # 2026-03-02 is a Monday; the range starts mid-week and ends mid-week.
+    await record_adherence(mongo, [dose(day) for day in ["2026-03-02", "2026-03-04", "2026-03-09", "2026-03-12", "2026-03-17"]])
+    series = (await adherence("2026-03-04", "2026-03-17", "week"))["series"]
+    assert [(entry["bucket"], entry["taken"]) for entry in series] == [("2026-W10", 1), ("2026-W11", 2), ("2026-W12", 1)]
+    
+    series = (await adherence("2026-03-04", "2026-03-05", "week"))["series"]
+    assert [(entry["bucket"], entry["taken"]) for entry in series] == [("2026-W10", 1)]
@@ -0,0 +1,73 @@
+import pytest
+from fastapi import HTTPException, Response
+
+import server
+from server import DoctorDay
+
+
+def day_with(*bookings):
+    doctor_day = DoctorDay()
+    for minute, appt_id in bookings:
+        doctor_day.add(minute, appt_id)
+    return doctor_day
+
+
+def test_conflicts_with_overlapping_bookings_only():
+    doctor_day = day_with((600, "a"), (660, "b"))
+    assert doctor_day.conflicts(600, 30) == ["a"]
+    assert doctor_day.conflicts(615, 30) == ["a"]
+    assert doctor_day.conflicts(645, 30) == ["b"]
+    assert doctor_day.conflicts(630, 30) == []
+
+
+def test_back_to_back_bookings_do_not_conflict():
+    doctor_day = day_with((600, "a"))
+    assert doctor_day.conflicts(570, 30) == []
+    assert doctor_day.conflicts(571, 30) == ["a"]
+    assert doctor_day.conflicts(629, 30) == ["a"]
+
+
+def test_remove_frees_the_slot():
+    doctor_day = day_with((600, "a"), (600, "b"))
+    doctor_day.remove("a")
+    assert doctor_day.conflicts(600, 30) == ["b"]
+
+
+def test_open_slots_skip_booked_and_overlapping_starts():
+    doctor_day = day_with((540, "a"), (615, "b"))
+    assert doctor_day.open_slots(540, 720, 30) == ["09:30", "11:00", "11:30"]
+
+
+def test_open_slots_stop_before_closing():
+    assert DoctorDay().open_slots(540, 600, 30) == ["09:00", "09:30"]
+    assert DoctorDay().open_slots(540, 590, 30) == ["09:00"]
+
+
+def test_bookings_outside_opening_hours_are_ignored():
+    doctor_day = day_with((480, "early"), (1020, "late"))
+    assert doctor_day.open_slots(540, 600, 30) == ["09:00", "09:30"]
+
+
+class FakeRequest:
+    headers = {}
+
+
+async def book(time_str, email="patient@example.com"):
+    appt = server.AppointmentCreate(doctor_name="Dr Lee", date="2026-03-01", time=time_str, type="checkup")
+    return await server.create_appointment(appt, FakeRequest(), Response(), {"email": email})
+
+
+@pytest.mark.anyio
+async def test_booking_made_by_another_worker_wins(mongo, monkeypatch):
+    monkeypatch.setattr(server, "availability_index", server.AvailabilityIndex(100, 60))
+    await book("09:00")
+    # Another worker books 10:00 after this process cached the day.
+    await mongo.appointments.insert_one({"id": "elsewhere", "doctor_name": "Dr Lee", "date": "2026-03-01", "time": "10:00", "status": "pending"})
+    with pytest.raises(HTTPException) as error:
+        await book("10:15")
+    assert error.value.status_code == 409
+    assert await mongo.appointments.count_documents({"time": "10:15"}) == 0
+    # The cached day now knows about the other worker's booking.
+    doctor_day = await server.availability_index.get("Dr Lee", "2026-03-01")
+    assert doctor_day.conflicts(600) == ["elsewhere"]
+    assert (await book("10:30")).time == "10:30"
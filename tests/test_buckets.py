@@ -0,0 +1,38 @@
+import pytest
+
+import server
+from server import push_bucket_events
+
+pytestmark = pytest.mark.anyio
+
+
+def events(count, prefix="e"):
+    return [{"id": f"{prefix}{i}", "date": "2026-03-01"} for i in range(count)]
+
+
+async def bucket_counts(mongo):
+    buckets = await mongo.daily_tracker_buckets.find({}, {"_id": 0, "count": 1, "events": 1}).to_list(None)
+    assert all(bucket["count"] == len(bucket["events"]) for bucket in buckets)
+    return sorted(bucket["count"] for bucket in buckets)
+
+
+async def test_large_group_is_split_into_full_buckets(mongo, monkeypatch):
+    monkeypatch.setattr(server, "TRACKER_BUCKET_SIZE", 5)
+    await push_bucket_events(mongo, {("a@example.com", "2026-03"): events(12)})
+    assert await bucket_counts(mongo) == [2, 5, 5]
+
+
+async def test_chunk_that_does_not_fit_opens_a_new_bucket(mongo, monkeypatch):
+    monkeypatch.setattr(server, "TRACKER_BUCKET_SIZE", 5)
+    await push_bucket_events(mongo, {("a@example.com", "2026-03"): events(4)})
+    await push_bucket_events(mongo, {("a@example.com", "2026-03"): events(3, "f")})
+    assert await bucket_counts(mongo) == [3, 4]
+    await push_bucket_events(mongo, {("a@example.com", "2026-03"): events(1, "g")})
+    assert await bucket_counts(mongo) in ([3, 5], [4, 4])
+
+
+async def test_months_and_users_get_separate_buckets(mongo, monkeypatch):
+    monkeypatch.setattr(server, "TRACKER_BUCKET_SIZE", 5)
+    await push_bucket_events(mongo, {("a@example.com", "2026-03"): events(2), ("a@example.com", "2026-04"): events(2),
+                                     ("b@example.com", "2026-03"): events(2)})
+    assert await bucket_counts(mongo) == [2, 2, 2]
@@ -0,0 +1,42 @@
+import pytest
+from fastapi import Response
+from starlette.datastructures import URL
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+EMAIL = "etag@example.com"
+
+
+class FakeRequest:
+    def __init__(self, if_none_match=None):
+        self.headers = {"if-none-match": if_none_match} if if_none_match else {}
+        self.url = URL("/api/profile")
+
+
+@pytest.fixture
+async def stored_user(mongo):
+    user = {"email": EMAIL, "name": "Stored", "versions": {"profile": 2}}
+    await mongo.users.insert_one(dict(user))
+    return user
+
+
+async def test_unchanged_profile_is_not_modified(stored_user):
+    response = Response()
+    body = await server.get_profile(FakeRequest(), response, dict(stored_user))
+    assert body.name == "Stored"
+    cached = await server.get_profile(FakeRequest(response.headers["etag"]), Response(), dict(stored_user))
+    assert cached.status_code == 304
+
+
+async def test_cached_user_is_served_when_its_version_is_current(stored_user):
+    body = await server.get_profile(FakeRequest(), Response(), {**stored_user, "name": "Cached"})
+    assert body.name == "Cached"
+
+
+async def test_stale_cached_user_is_replaced_by_stored_profile(stored_user):
+    response = Response()
+    body = await server.get_profile(FakeRequest(), response, {**stored_user, "name": "Old", "versions": {"profile": 1}})
+    assert body.name == "Stored"
+    assert response.headers["etag"].startswith('W/"profile-2-')
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import IdempotentRequest
+
+pytestmark = pytest.mark.anyio
+
+USER = {"email": "idem@example.com"}
+
+
+class FakeRequest:
+    def __init__(self, key):
+        self.headers = {"idempotency-key": key} if key else {}
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(server, "idempotency_cache", server.TTLCache(100, 300))
+
+
+async def run(key, payload, result=None, fail=False):
+    async with IdempotentRequest(FakeRequest(key), USER, "create_thing", payload) as idem:
+        if idem.replay is not None:
+            return idem.replay
+        if fail:
+            raise RuntimeError("handler failed")
+        idem.result = result
+        return result
+
+
+async def test_without_key_runs_every_time(mongo):
+    assert await run(None, {"n": 1}, {"id": "a"}) == {"id": "a"}
+    assert await run(None, {"n": 1}, {"id": "b"}) == {"id": "b"}
+    assert await mongo.idempotency_keys.count_documents({}) == 0
+
+
+async def test_retry_replays_stored_response(mongo):
+    assert await run("k1", {"n": 1}, {"id": "a"}) == {"id": "a"}
+    replay = await run("k1", {"n": 1}, {"id": "b"})
+    assert replay.status_code == 200
+    assert replay.body == b'{"id":"a"}'
+    assert replay.headers["idempotent-replayed"] == "true"
+
+
+async def test_replay_survives_a_cold_cache(mongo, monkeypatch):
+    await run("k1", {"n": 1}, {"id": "a"})
+    monkeypatch.setattr(server, "idempotency_cache", server.TTLCache(100, 300))
+    assert (await run("k1", {"n": 1}, {"id": "b"})).body == b'{"id":"a"}'
+
+
+async def test_reused_key_with_different_payload_is_rejected(mongo):
+    await run("k1", {"n": 1}, {"id": "a"})
+    with pytest.raises(HTTPException) as error:
+        await run("k1", {"n": 2}, {"id": "b"})
+    assert error.value.status_code == 422
+
+
+async def test_key_in_progress_is_conflict(mongo):
+    async with IdempotentRequest(FakeRequest("k1"), USER, "create_thing", {"n": 1}):
+        with pytest.raises(HTTPException) as error:
+            await run("k1", {"n": 1}, {"id": "b"})
+        assert error.value.status_code == 409
+
+
+async def test_in_progress_key_with_different_payload_is_rejected(mongo):
+    async with IdempotentRequest(FakeRequest("k1"), USER, "create_thing", {"n": 1}):
+        with pytest.raises(HTTPException) as error:
+            await run("k1", {"n": 2}, {"id": "b"})
+        assert error.value.status_code == 422
+
+
+async def test_failed_request_releases_key(mongo):
+    with pytest.raises(RuntimeError):
+        await run("k1", {"n": 1}, fail=True)
+    assert await mongo.idempotency_keys.count_documents({}) == 0
+    assert await run("k1", {"n": 1}, {"id": "a"}) == {"id": "a"}
+
+
+async def test_retry_takes_over_claim_past_its_lease(mongo):
+    # A worker claimed the key and died before finishing.
+    await mongo.idempotency_keys.insert_one({
+        "_id": "idem@example.com:create_thing:k1",
+        "fingerprint": IdempotentRequest(FakeRequest("k1"), USER, "create_thing", {"n": 1}).fingerprint,
+        "state": "in_progress",
+        "claim": "dead-worker",
+        "claimed_until": datetime.now(timezone.utc) - timedelta(seconds=1),
+        "created_at": datetime.now(timezone.utc) - timedelta(minutes=5),
+    })
+    assert await run("k1", {"n": 1}, {"id": "a"}) == {"id": "a"}
+    record = await mongo.idempotency_keys.find_one({"_id": "idem@example.com:create_thing:k1"})
+    assert record["state"] == "completed"
+    assert (await run("k1", {"n": 1}, {"id": "b"})).body == b'{"id":"a"}'
+
+
+async def test_late_finish_does_not_overwrite_the_new_claim(mongo, monkeypatch):
+    monkeypatch.setattr(server, "IDEMPOTENCY_LEASE_SECONDS", -1)
+    async with IdempotentRequest(FakeRequest("k1"), USER, "create_thing", {"n": 1}) as stale:
+        assert await run("k1", {"n": 1}, {"id": "new"}) == {"id": "new"}
+        stale.result = {"id": "stale"}
+    monkeypatch.setattr(server, "idempotency_cache", server.TTLCache(100, 300))
+    assert (await run("k1", {"n": 1}, {"id": "b"})).body == b'{"id":"new"}'
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from server import _renew_lease, record_event_change
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_first_owner_takes_the_lease(mongo):
+    assert await _renew_lease(mongo.leases, "job", "a", 30)
+    assert await _renew_lease(mongo.leases, "job", "a", 30)
+    assert not await _renew_lease(mongo.leases, "job", "b", 30)
+    assert (await mongo.leases.find_one({"_id": "job"}))["owner"] == "a"
+
+
+async def test_expired_lease_is_taken_over(mongo):
+    await mongo.leases.insert_one({"_id": "job", "owner": "a", "lease_until": datetime.now(timezone.utc) - timedelta(seconds=1)})
+    assert await _renew_lease(mongo.leases, "job", "b", 30)
+    assert not await _renew_lease(mongo.leases, "job", "a", 30)
+
+
+async def test_renewal_saves_extra_fields(mongo):
+    await _renew_lease(mongo.leases, "job", "a", 30, {"resume_token": {"_data": "82"}})
+    assert not await _renew_lease(mongo.leases, "job", "b", 30, {"resume_token": {"_data": "99"}})
+    assert (await mongo.leases.find_one({"_id": "job"}))["resume_token"] == {"_data": "82"}
+
+
+async def test_event_change_is_logged_once_per_call(mongo):
+    await mongo.users.insert_one({"email": "ev@example.com"})
+    await record_event_change({"ns": {"coll": "appointments"}, "fullDocument": {"id": "a1", "user_email": "ev@example.com"}})
+    await record_event_change({"ns": {"coll": "messages"}, "fullDocument": {"id": "m1", "user_email": "ev@example.com"}})
+    await record_event_change({"ns": {"coll": "messages"}, "fullDocument": None})
+    user = await mongo.users.find_one({"email": "ev@example.com"})
+    assert user["sync_seq"] == 2
+    assert user["versions"] == {"appointments": 1}
+    assert await mongo.change_log.count_documents({}) == 2
@@ -0,0 +1,61 @@
+import server
+from server import TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def limiter(monkeypatch, max_keys=100):
+    clock = FakeClock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return TokenBucketLimiter(max_keys), clock
+
+
+def test_burst_then_limited(monkeypatch):
+    buckets, _ = limiter(monkeypatch)
+    assert [buckets.acquire(("ip", "auth"), 1.0, 3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.acquire(("ip", "auth"), 1.0, 3) == 1.0
+    assert buckets.limited == 1
+
+
+def test_tokens_refill_with_time_up_to_burst(monkeypatch):
+    buckets, clock = limiter(monkeypatch)
+    for _ in range(2):
+        buckets.acquire(("ip", "auth"), 2.0, 2)
+    clock.now += 0.25
+    assert buckets.acquire(("ip", "auth"), 2.0, 2) == 0.25
+    clock.now += 0.25
+    assert buckets.acquire(("ip", "auth"), 2.0, 2) == 0.0
+    clock.now += 60
+    assert [buckets.acquire(("ip", "auth"), 2.0, 2) for _ in range(3)][-1] > 0
+
+
+def test_keys_are_independent(monkeypatch):
+    buckets, _ = limiter(monkeypatch)
+    assert buckets.acquire(("a", "auth"), 1.0, 1) == 0.0
+    assert buckets.acquire(("a", "auth"), 1.0, 1) > 0
+    assert buckets.acquire(("b", "auth"), 1.0, 1) == 0.0
+    assert buckets.acquire(("a", "default"), 1.0, 1) == 0.0
+
+
+def test_least_recently_used_key_is_evicted(monkeypatch):
+    buckets, _ = limiter(monkeypatch, max_keys=2)
+    buckets.acquire(("a",), 1.0, 1)
+    buckets.acquire(("b",), 1.0, 1)
+    buckets.acquire(("a",), 1.0, 1)
+    buckets.acquire(("c",), 1.0, 1)
+    assert list(buckets._buckets) == [("a",), ("c",)]
+    # An evicted client starts with a full bucket again.
+    assert buckets.acquire(("b",), 1.0, 1) == 0.0
+
+
+def test_zero_rate_never_refills(monkeypatch):
+    buckets, clock = limiter(monkeypatch)
+    assert buckets.acquire(("ip",), 0.0, 1) == 0.0
+    clock.now += 3600
+    assert buckets.acquire(("ip",), 0.0, 1) == 60.0
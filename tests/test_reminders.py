@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+
+from server import UserSchedule
+
+
+def at(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def schedule_with(meds=(), appts=()):
+    schedule = UserSchedule()
+    for med in meds:
+        schedule.put_medication(med)
+    for appt in appts:
+        schedule.put_appointment(appt)
+    return schedule
+
+
+def med(med_id, times):
+    return {"id": med_id, "name": med_id.upper(), "dosage": "1 tab", "times": times}
+
+
+def appt(appt_id, day, time_str, status="pending"):
+    return {"id": appt_id, "doctor_name": "Dr Lee", "type": "in-person", "reason": None, "date": day, "time": time_str, "status": status}
+
+
+def due(items):
+    return [item["due_at"][:16] for item in items]
+
+
+def test_doses_inside_window_only():
+    schedule = schedule_with([med("a", ["08:00", "12:00", "20:00"])])
+    assert due(schedule.upcoming(at("2026-03-01T07:00"), 6 * 60)) == ["2026-03-01T08:00", "2026-03-01T12:00"]
+
+
+def test_dose_due_now_is_skipped_once_the_minute_has_started():
+    schedule = schedule_with([med("a", ["08:00"])])
+    assert due(schedule.upcoming(at("2026-03-01T08:00"), 60)) == ["2026-03-01T08:00"]
+    assert due(schedule.upcoming(at("2026-03-01T08:00:30"), 60)) == []
+
+
+def test_window_spanning_midnight_wraps_to_next_day():
+    schedule = schedule_with([med("a", ["00:30", "23:00"])])
+    assert due(schedule.upcoming(at("2026-03-01T22:00"), 4 * 60)) == ["2026-03-01T23:00", "2026-03-02T00:30"]
+
+
+def test_multi_day_window_repeats_doses():
+    schedule = schedule_with([med("a", ["09:00"])])
+    assert due(schedule.upcoming(at("2026-03-01T10:00"), 3 * 24 * 60)) == [
+        "2026-03-02T09:00", "2026-03-03T09:00", "2026-03-04T09:00",
+    ]
+
+
+def test_appointments_merge_in_time_order_and_past_ones_drop():
+    schedule = schedule_with([med("a", ["09:00"])], [appt("past", "2026-03-01", "07:00"), appt("soon", "2026-03-01", "08:30")])
+    items = schedule.upcoming(at("2026-03-01T08:00"), 120)
+    assert [(item["type"], item["due_at"][11:16]) for item in items] == [("appointment", "08:30"), ("medication", "09:00")]
+    assert "past" not in schedule.appointments
+
+
+def test_non_pending_appointments_and_removed_medications_are_excluded():
+    schedule = schedule_with([med("a", ["09:00"])], [appt("done", "2026-03-01", "08:30", status="completed")])
+    schedule.remove_medication("a")
+    assert schedule.upcoming(at("2026-03-01T08:00"), 120) == []
+
+
+def test_put_medication_replaces_previous_times():
+    schedule = schedule_with([med("a", ["09:00"])])
+    schedule.put_medication(med("a", ["10:00"]))
+    assert due(schedule.upcoming(at("2026-03-01T08:00"), 180)) == ["2026-03-01T10:00"]
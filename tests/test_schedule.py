@@ -0,0 +1,101 @@
+from datetime import date, datetime, timezone
+
+from server import expand_schedule
+
+
+def med(med_id, times, created_at="2026-01-01T00:00:00+00:00"):
+    return {"id": med_id, "name": med_id.upper(), "dosage": "1 tab", "times": times, "created_at": created_at}
+
+
+def event(med_id, day, time_str, taken=True, missed=False):
+    return {"medication_id": med_id, "date": day, "scheduled_time": f"{day}T{time_str}:00", "taken": taken, "missed": missed}
+
+
+def at(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def statuses(slots):
+    return [(slot["date"], slot["time"], slot["medication_id"], slot["status"]) for slot in slots]
+
+
+def test_expands_every_day_and_time_in_order():
+    slots = expand_schedule([med("a", ["20:00", "08:00"]), med("b", ["12:00"])], [],
+                            date(2026, 3, 1), date(2026, 3, 2), at("2026-02-01T00:00"))
+    assert [(slot["date"], slot["time"], slot["medication_id"]) for slot in slots] == [
+        ("2026-03-01", "20:00", "a"), ("2026-03-01", "08:00", "a"), ("2026-03-01", "12:00", "b"),
+        ("2026-03-02", "20:00", "a"), ("2026-03-02", "08:00", "a"), ("2026-03-02", "12:00", "b"),
+    ]
+    assert all(slot["status"] == "upcoming" and not slot["reported"] for slot in slots)
+
+
+def test_slot_boundaries_at_start_and_end_of_day():
+    slots = expand_schedule([med("a", ["00:00", "23:59"])],
+                            [event("a", "2026-03-01", "00:00"), event("a", "2026-03-01", "23:59")],
+                            date(2026, 3, 1), date(2026, 3, 1), at("2026-03-02T12:00"))
+    assert statuses(slots) == [("2026-03-01", "00:00", "a", "taken"), ("2026-03-01", "23:59", "a", "taken")]
+
+
+def test_event_matches_nearest_slot_of_same_medication():
+    slots = expand_schedule([med("a", ["08:00", "20:00"]), med("b", ["08:00"])],
+                            [event("a", "2026-03-01", "15:00")],
+                            date(2026, 3, 1), date(2026, 3, 1), at("2026-03-01T07:00"))
+    assert statuses(slots) == [
+        ("2026-03-01", "08:00", "a", "upcoming"), ("2026-03-01", "20:00", "a", "taken"), ("2026-03-01", "08:00", "b", "upcoming"),
+    ]
+
+
+def test_dose_taken_after_midnight_matches_previous_evening():
+    slots = expand_schedule([med("a", ["08:00", "23:30"])], [event("a", "2026-03-02", "00:20")],
+                            date(2026, 3, 1), date(2026, 3, 2), at("2026-03-02T07:00"))
+    assert statuses(slots) == [
+        ("2026-03-01", "08:00", "a", "missed"), ("2026-03-01", "23:30", "a", "taken"),
+        ("2026-03-02", "08:00", "a", "upcoming"), ("2026-03-02", "23:30", "a", "upcoming"),
+    ]
+
+
+def test_dose_taken_after_midnight_outside_range_still_counts():
+    # The event falls on the day after the requested range, but belongs to its last slot.
+    slots = expand_schedule([med("a", ["23:30"])], [event("a", "2026-03-02", "00:10")],
+                            date(2026, 3, 1), date(2026, 3, 1), at("2026-03-02T08:00"))
+    assert statuses(slots) == [("2026-03-01", "23:30", "a", "taken")]
+
+
+def test_medication_created_mid_range_skips_earlier_days():
+    slots = expand_schedule([med("a", ["09:00"]), med("b", ["09:00"], created_at="2026-03-02T15:00:00+00:00")], [],
+                            date(2026, 3, 1), date(2026, 3, 3), at("2026-02-01T00:00"))
+    assert [(slot["date"], slot["medication_id"]) for slot in slots] == [
+        ("2026-03-01", "a"), ("2026-03-02", "a"), ("2026-03-02", "b"), ("2026-03-03", "a"), ("2026-03-03", "b"),
+    ]
+
+
+def test_medication_created_after_range_has_no_slots():
+    slots = expand_schedule([med("a", ["09:00"], created_at="2026-04-01T00:00:00+00:00")], [],
+                            date(2026, 3, 1), date(2026, 3, 3), at("2026-02-01T00:00"))
+    assert slots == []
+
+
+def test_missed_only_after_grace_period():
+    meds = [med("a", ["08:00"])]
+    just_due = expand_schedule(meds, [], date(2026, 3, 1), date(2026, 3, 1), at("2026-03-01T08:59"))
+    overdue = expand_schedule(meds, [], date(2026, 3, 1), date(2026, 3, 1), at("2026-03-01T09:01"))
+    assert just_due[0]["status"] == "upcoming"
+    assert overdue[0]["status"] == "missed"
+    assert not overdue[0]["reported"]
+
+
+def test_reported_missed_dose_is_missed_before_grace():
+    slots = expand_schedule([med("a", ["08:00"])], [event("a", "2026-03-01", "08:00", taken=False, missed=True)],
+                            date(2026, 3, 1), date(2026, 3, 1), at("2026-03-01T07:00"))
+    assert slots[0]["status"] == "missed"
+    assert slots[0]["reported"]
+
+
+def test_events_for_unknown_medications_are_ignored():
+    slots = expand_schedule([med("a", ["08:00"])], [event("gone", "2026-03-01", "08:00")],
+                            date(2026, 3, 1), date(2026, 3, 1), at("2026-03-01T07:00"))
+    assert statuses(slots) == [("2026-03-01", "08:00", "a", "upcoming")]
+
+
+def test_no_times_gives_no_slots():
+    assert expand_schedule([med("a", [])], [], date(2026, 3, 1), date(2026, 3, 1), at("2026-03-01T07:00")) == []
@@ -0,0 +1,55 @@
+from server import UserSearchIndex
+
+
+def build(*docs):
+    index = UserSearchIndex()
+    for kind, doc in docs:
+        index.put(kind, doc)
+    return index
+
+
+def keys(hits):
+    return [key for _, key in hits]
+
+
+def test_all_terms_must_match():
+    index = build(
+        ("medication", {"id": "m1", "name": "Aspirin", "instructions": "after food"}),
+        ("medication", {"id": "m2", "name": "Metformin", "instructions": "with food"}),
+    )
+    assert sorted(keys(index.search("food"))) == [("medication", "m1"), ("medication", "m2")]
+    assert keys(index.search("aspirin food")) == [("medication", "m1")]
+    assert index.search("aspirin insulin") == []
+    assert index.search("") == []
+
+
+def test_search_is_case_insensitive_across_fields():
+    index = build(("appointment", {"id": "a1", "reason": "Knee pain", "doctor_name": "Dr Smith"}))
+    assert keys(index.search("SMITH knee")) == [("appointment", "a1")]
+
+
+def test_more_occurrences_and_rarer_terms_rank_higher():
+    index = build(
+        ("message", {"id": "1", "message": "headache", "reply": "rest"}),
+        ("message", {"id": "2", "message": "headache headache again", "reply": "see a doctor"}),
+        ("message", {"id": "3", "message": "rest well", "reply": "ok"}),
+    )
+    assert keys(index.search("headache")) == [("message", "2"), ("message", "1")]
+
+
+def test_ties_break_on_newest_first():
+    index = build(
+        ("message", {"id": "old", "message": "dizzy", "created_at": "2026-01-01T00:00:00"}),
+        ("message", {"id": "new", "message": "dizzy", "created_at": "2026-02-01T00:00:00"}),
+    )
+    assert keys(index.search("dizzy")) == [("message", "new"), ("message", "old")]
+
+
+def test_put_replaces_and_remove_drops_postings():
+    index = build(("medication", {"id": "m1", "name": "Aspirin", "instructions": None}))
+    index.put("medication", {"id": "m1", "name": "Ibuprofen", "instructions": None})
+    assert index.search("aspirin") == []
+    assert keys(index.search("ibuprofen")) == [("medication", "m1")]
+    index.remove(("medication", "m1"))
+    assert index.search("ibuprofen") == []
+    assert index.postings == {} and index.documents == {}
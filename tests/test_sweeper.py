@@ -0,0 +1,68 @@
+import pytest
+
+import server
+from server import _matched_slot, insert_tracker_events, record_adherence, supersede_swept_doses
+
+EMAIL = "late@example.com"
+MED = {"id": "m1", "name": "Aspirin", "times": ["08:00", "23:30"]}
+
+
+def taken(day, time_str):
+    return {"id": f"t-{day}-{time_str}", "user_email": EMAIL, "date": day, "medication_id": "m1", "medication_name": "Aspirin",
+            "scheduled_time": f"{day}T{time_str}:00+00:00", "taken": True, "taken_at": None, "missed": False}
+
+
+def swept(day, time_str):
+    return {"id": f"s-{day}-{time_str}", "user_email": EMAIL, "date": day, "medication_id": "m1", "medication_name": "Aspirin",
+            "scheduled_time": f"{day}T{time_str}:00+00:00", "taken": False, "taken_at": None, "missed": True, "source": "sweeper"}
+
+
+def test_matched_slot_is_nearest_dose_time():
+    assert _matched_slot(MED["times"], taken("2026-03-01", "09:10")) == "2026-03-01T08:00"
+    assert _matched_slot(MED["times"], taken("2026-03-01", "20:00")) == "2026-03-01T23:30"
+    assert _matched_slot(["08:00", "20:00"], taken("2026-03-01", "14:00")) == "2026-03-01T08:00"
+
+
+def test_matched_slot_after_midnight_is_previous_evening():
+    assert _matched_slot(MED["times"], taken("2026-03-02", "00:40")) == "2026-03-01T23:30"
+
+
+def test_matched_slot_without_times():
+    assert _matched_slot([], taken("2026-03-01", "09:00")) is None
+
+
+async def rollup(mongo, granularity, bucket):
+    return await mongo.adherence_rollups.find_one(
+        {"user_email": EMAIL, "medication_id": "m1", "granularity": granularity, "bucket": bucket}, {"_id": 0, "taken": 1, "missed": 1, "events": 1}
+    )
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("storage", ["documents", "buckets"])
+async def test_late_dose_replaces_sweeper_miss(mongo, monkeypatch, storage):
+    monkeypatch.setattr(server, "TRACKER_STORAGE", storage)
+    sweeps = [swept("2026-03-01", "08:00"), swept("2026-03-01", "23:30")]
+    await insert_tracker_events(mongo, sweeps)
+    await record_adherence(mongo, sweeps)
+    
+    late = taken("2026-03-02", "00:15")
+    await insert_tracker_events(mongo, [late])
+    await record_adherence(mongo, [late])
+    assert await supersede_swept_doses(mongo, EMAIL, [late], {"m1": MED}) == 1
+    
+    remaining = await server.find_tracker_events(mongo, EMAIL, "2026-03-01", "2026-03-02")
+    assert sorted(event["id"] for event in remaining) == ["s-2026-03-01-08:00", "t-2026-03-02-00:15"]
+    assert await rollup(mongo, "day", "2026-03-01") == {"taken": 0, "missed": 1, "events": 1}
+    assert await rollup(mongo, "month", "2026-03") == {"taken": 1, "missed": 1, "events": 2}
+    # Logging it again doesn't take the miss back out twice.
+    assert await supersede_swept_doses(mongo, EMAIL, [late], {"m1": MED}) == 0
+    assert await rollup(mongo, "month", "2026-03") == {"taken": 1, "missed": 1, "events": 2}
+
+
+@pytest.mark.anyio
+async def test_reported_misses_and_other_slots_are_kept(mongo):
+    reported = {**swept("2026-03-01", "08:00"), "source": None, "id": "r1"}
+    await insert_tracker_events(mongo, [reported, swept("2026-03-01", "23:30")])
+    assert await supersede_swept_doses(mongo, EMAIL, [taken("2026-03-01", "08:05")], {"m1": MED}) == 0
+    assert await supersede_swept_doses(mongo, EMAIL, [{**taken("2026-03-01", "23:31"), "taken": False, "missed": True}], {"m1": MED}) == 0
+    assert await mongo.daily_tracker.count_documents({}) == 2
@@ -0,0 +1,120 @@
+import time
+
+import orjson
+import pytest
+
+import server
+from server import bump_versions, record_changes, settled_sync_seq
+
+pytestmark = pytest.mark.anyio
+
+EMAIL = "sync@example.com"
+
+
+class FakeRequest:
+    headers = {}
+
+
+@pytest.fixture
+async def user(mongo):
+    await server.ensure_indexes(mongo)
+    await mongo.users.insert_one({"email": EMAIL, "name": "S"})
+    return EMAIL
+
+
+async def add_medication(mongo, med_id):
+    await mongo.medications.insert_one({"id": med_id, "user_email": EMAIL, "name": med_id, "dosage": "1", "times": []})
+    await bump_versions(EMAIL, "medications", changes=(("medications", med_id, "upsert"),))
+
+
+async def sync(since):
+    response = await server.sync(FakeRequest(), since=since, current_user={"email": EMAIL})
+    return orjson.loads(response.body)
+
+
+def test_settled_without_pending_is_sync_seq():
+    assert settled_sync_seq({}) == 0
+    assert settled_sync_seq({"sync_seq": 7}) == 7
+
+
+def test_settled_stops_below_oldest_pending():
+    now = time.time()
+    user = {"sync_seq": 9, "sync_pending": {"a": {"seq": 6, "at": now}, "b": {"seq": 4, "at": now}}}
+    assert settled_sync_seq(user) == 3
+
+
+def test_settled_ignores_abandoned_pending():
+    user = {"sync_seq": 9, "sync_pending": {"a": {"seq": 4, "at": time.time() - server.SYNC_PENDING_TIMEOUT_SECONDS - 1}}}
+    assert settled_sync_seq(user) == 9
+
+
+async def test_bump_versions_allocates_contiguous_ranges(mongo, user):
+    await bump_versions(EMAIL, "medications", changes=(("medications", "a", "upsert"), ("medications", "b", "upsert")))
+    await bump_versions(EMAIL, "appointments", changes=(("appointments", "c", "upsert"),))
+    doc = await mongo.users.find_one({"email": EMAIL})
+    assert doc["sync_seq"] == 3
+    assert doc["versions"] == {"medications": 1, "appointments": 1}
+    assert not doc.get("sync_pending")
+    entries = await mongo.change_log.find({}, {"_id": 0, "doc_id": 1, "seq": 1}).sort("seq", 1).to_list(None)
+    assert entries == [{"doc_id": "a", "seq": 1}, {"doc_id": "b", "seq": 2}, {"doc_id": "c", "seq": 3}]
+
+
+async def test_bump_versions_for_missing_user_logs_nothing(mongo, user):
+    await bump_versions("nobody@example.com", "medications", changes=(("medications", "a", "upsert"),))
+    assert await mongo.change_log.count_documents({}) == 0
+
+
+async def test_record_changes_keeps_latest_sequence_per_document(mongo, user):
+    await record_changes(mongo, EMAIL, 5, (("medications", "a", "upsert"),))
+    await record_changes(mongo, EMAIL, 8, (("medications", "a", "delete"),))
+    # A slower writer with an older sequence arrives last; its duplicate key is swallowed.
+    await record_changes(mongo, EMAIL, 6, (("medications", "a", "upsert"), ("medications", "b", "upsert")))
+    entries = await mongo.change_log.find({}, {"_id": 0, "doc_id": 1, "seq": 1, "op": 1}).sort("doc_id", 1).to_list(None)
+    assert entries == [{"doc_id": "a", "seq": 8, "op": "delete"}, {"doc_id": "b", "seq": 7, "op": "upsert"}]
+
+
+async def test_sync_pages_through_changes(mongo, user, monkeypatch):
+    monkeypatch.setattr(server, "SYNC_MAX_CHANGES", 2)
+    for med_id in ("a", "b", "c"):
+        await add_medication(mongo, med_id)
+    snapshot = await sync(0)
+    assert snapshot["reset"] and snapshot["seq"] == 3
+    assert sorted(med["id"] for med in snapshot["changes"]["medications"]) == ["a", "b", "c"]
+    
+    page = await sync(1)
+    assert not page["has_more"] and page["seq"] == 3
+    assert sorted(med["id"] for med in page["changes"]["medications"]) == ["b", "c"]
+    
+    await mongo.medications.delete_one({"id": "b"})
+    await bump_versions(EMAIL, "medications", changes=(("medications", "b", "delete"),))
+    await add_medication(mongo, "d")
+    # c at 3, b's entry moved to 4 by the delete, d at 5.
+    first = await sync(1)
+    assert first["has_more"] and first["seq"] == 4
+    assert [med["id"] for med in first["changes"]["medications"]] == ["c"]
+    assert first["deleted"] == {"medications": ["b"]}
+    rest = await sync(first["seq"])
+    assert not rest["has_more"] and rest["seq"] == 5
+    assert [med["id"] for med in rest["changes"]["medications"]] == ["d"]
+    assert (await sync(rest["seq"]))["changes"] == {}
+
+
+async def test_sync_stops_below_pending_sequence(mongo, user):
+    await add_medication(mongo, "a")
+    # Sequence 2 is allocated but its log entry hasn't landed; 3 has.
+    await mongo.users.update_one({"email": EMAIL}, {"$set": {"sync_seq": 3, "sync_pending.w": {"seq": 2, "at": time.time()}}})
+    await server.record_changes(mongo, EMAIL, 3, (("medications", "c", "upsert"),))
+    page = await sync(1)
+    assert page["seq"] == 1 and page["changes"] == {}
+    await mongo.users.update_one({"email": EMAIL}, {"$unset": {"sync_pending.w": ""}})
+    assert (await sync(1))["seq"] == 3
+
+
+async def test_sync_resets_clients_behind_the_floor(mongo, user):
+    await add_medication(mongo, "a")
+    await add_medication(mongo, "b")
+    await mongo.users.update_one({"email": EMAIL}, {"$set": {"sync_floor": 2}})
+    page = await sync(1)
+    assert page["reset"] and page["seq"] == 2
+    assert sorted(med["id"] for med in page["changes"]["medications"]) == ["a", "b"]
+    assert not (await sync(2))["reset"]